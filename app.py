@@ -1,9 +1,10 @@
 import dash
-from dash.dependencies import Output, Input, State, ALL
+from dash.dependencies import Output, Input, State, ALL, ClientsideFunction
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 
 import flask
+from flask_compress import Compress
 import plotly.io as pio
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from werkzeug import run_simple
@@ -12,13 +13,30 @@ from layouts import tickers
 from layouts import relatorio
 from layouts import ajuda
 import app_config as cfg
-import report
+import cache
+import jobs
+import metadata
 import utils
+import warmup
+
+
+
+def engine():
+    '''
+    Módulo de relatórios, importado apenas no primeiro uso.
+
+    O módulo carrega o cvxopt, o numpy e o pandas, que não são usados pelas
+    páginas de tickers e de ajuda. Os workers do gunicorn o importam antes
+    do primeiro relatório (`warmup`).
+    '''
+    import report
+    return report
 
 
 
 server = flask.Flask(__name__)
 server.secret_key = cfg.SECRET_KEY
+Compress(server)    # Os três apps do Dash compartilham o mesmo servidor
 pio.templates.default = cfg.PLOTLY_TEMPLATE
 
 external_stylesheets = [
@@ -81,6 +99,19 @@ def render_relatorio():
 def render_ajuda():
     return flask.redirect('/PyAjuda')
 
+@server.route('/cache/')
+def cache_stats():
+    return flask.jsonify(cache.reports.stats())
+
+@server.route('/validar/')
+def validate_tickers():
+    tickers = flask.request.args.get('tickers', '').upper().split(',')
+    tickers = list(dict.fromkeys(t.strip() for t in tickers if t.strip()))
+    if len(tickers) > cfg.TICKER_BATCH_MAX:
+        error = f'Máximo de {cfg.TICKER_BATCH_MAX} tickers por consulta'
+        return flask.jsonify({'error': error}), 400
+    return flask.jsonify(metadata.default_service().validate(tickers))
+
 
 
 @tickers_app.callback(
@@ -163,76 +194,243 @@ def go_to_report(_, data):
 
 
 
+def get_report(report_id, hashtags, period, freq):
+    report = engine()
+    r = cache.reports.get(report_id)
+    if r is None:
+        _, r = report.load(hashtags, period=period, freq=freq)
+    return r
+
+
+
 @relatorio_app.callback(
+    Output('report_job', 'data'),
+    Input('location', 'hash'),
+    Input('report_period', 'value'),
+    Input('report_freq', 'value'),
+    State('previous_report', 'data'))
+def load_relatorio(hashtags, period, freq, previous):
+    report = engine()
+    tickers = ','.join(report.parse_hashtags(hashtags))
+    job_id = jobs.queue.job_key(f'{tickers}/{period}{freq}')
+    return jobs.queue.submit(
+        job_id,
+        lambda progress: report.load(
+            hashtags,
+            progress,
+            previous,
+            period,
+            freq
+        )[0]
+    )
+
+
+
+@relatorio_app.callback(
+    Output('report_stage', 'children'),
+    Output('report_progress', 'value'),
+    Output('report_loading', 'style'),
+    Output('report_poll', 'disabled'),
     Output('corr_table', 'children'),
-    Output('monthly_returns', 'data'),
-    Output('portfolios_data', 'data'),
-    Input('location', 'hash'))
-def load_relatorio(hashtags):
-    r = report.Markowitz(hashtags)
+    Output('corr_matrix', 'figure'),
+    Output('corr_matrix', 'style'),
+    Output('report_id', 'data'),
+    Output('previous_report', 'data'),
+    Input('report_poll', 'n_intervals'),
+    Input('report_job', 'data'),
+    State('location', 'hash'),
+    State('report_period', 'value'),
+    State('report_freq', 'value'),
+    prevent_initial_call = True)
+def poll_relatorio(_, job_id, hashtags, period, freq):
+    report = engine()
+    status = jobs.queue.status(job_id)
+    if status is None:
+        raise PreventUpdate
+
+    if status['error'] is not None:
+        return (
+            f'Erro ao gerar o relatório: {status["error"]}',
+            100,
+            dash.no_update,
+            True,
+            dash.no_update,
+            dash.no_update,
+            dash.no_update,
+            dash.no_update,
+            dash.no_update
+        )
+
+    if status['result'] is None:
+        return (
+            report.STAGES.get(status['stage'], 'Aguardando'),
+            100 * status['progress'],
+            {'display': 'block'},
+            False,
+            dash.no_update,
+            dash.no_update,
+            dash.no_update,
+            dash.no_update,
+            dash.no_update
+        )
+
+    report_id = status['result']
+    r = get_report(report_id, hashtags, period, freq)
+    alert = None
+    if r.failed:
+        alert = dbc.Alert(
+            f'Tickers não encontrados: {", ".join(r.failed)}',
+            color = 'warning'
+        )
     return (
-        r.corr_table(),
-        r.df.to_json(),
-        r.portfolios.to_json()
+        None,
+        100,
+        {'display': 'none'},
+        True,
+        alert,
+        r.corr_matrix(),
+        {'display': 'block'},
+        report_id,
+        report_id
     )
 
 
 
+@relatorio_app.callback(
+    Output('frontier_figure', 'data'),
+    Input('report_id', 'data'),
+    State('location', 'hash'),
+    State('report_period', 'value'),
+    State('report_freq', 'value'),
+    prevent_initial_call = True)
+def load_efficiency_frontier(report_id, hashtags, period, freq):
+    report = engine()
+    r = get_report(report_id, hashtags, period, freq)
+    alloc = report.MarkowitzAllocation(r.portfolios, 0, r.allocations[0])
+    return alloc.efficiency_frontier(r.tangency)
+
+
+
+relatorio_app.clientside_callback(
+    ClientsideFunction('diversificador', 'highlight_portfolio'),
+    Output('efficiency_frontier', 'figure'),
+    Input('efficiency_frontier', 'clickData'),
+    Input('frontier_figure', 'data'))
+
+
+
 @relatorio_app.callback(
     Output('portfolios_returns', 'children'),
-    Output('portfolios_chart', 'figure'),
+    Output('portfolio_allocation', 'data'),
     Output('selected_portfolio', 'data'),
-    Output('efficiency_frontier', 'figure'),
     Input('efficiency_frontier', 'clickData'),
-    Input('portfolios_data', 'data'))
-def select_portfolio_risk(click, data):
-    portfolio = 0 if click is None else click['points'][0]['pointNumber']
-    r = report.MarkowitzAllocation(data, portfolio)
+    Input('report_id', 'data'),
+    State('location', 'hash'),
+    State('report_period', 'value'),
+    State('report_freq', 'value'),
+    prevent_initial_call = True)
+def select_portfolio_risk(click, report_id, hashtags, period, freq):
+    report = engine()
+    cc = dash.callback_context.triggered[0]['prop_id']
+    if cc == 'report_id.data' or click is None:
+        portfolio = 0
+    elif click['points'][0]['curveNumber'] == 0:
+        portfolio = click['points'][0]['pointNumber']
+    else:
+        raise PreventUpdate
+
+    r = get_report(report_id, hashtags, period, freq)
+    alloc = report.MarkowitzAllocation(
+        r.portfolios,
+        portfolio,
+        r.allocations[portfolio]
+    )
+    cal = report.CapitalAllocation(
+        alloc.portfolio.to_dict(),
+        r.selic,
+        r.cml
+    )
     return (
-        r.expected_returns(),
-        r.pie(),
-        r.portfolio.to_json(),
-        r.efficiency_frontier()
+        alloc.expected_returns(),
+        alloc.allocation,
+        cal.payload()
     )
 
 
 
-@relatorio_app.callback(
+relatorio_app.clientside_callback(
+    ClientsideFunction('diversificador', 'allocation_pie'),
+    Output('portfolios_chart', 'figure'),
+    Input('portfolio_allocation', 'data'),
+    State('plotly_template', 'data'))
+
+
+
+relatorio_app.clientside_callback(
+    ClientsideFunction('diversificador', 'capital_allocation'),
     Output('capital_allocation_line', 'figure'),
     Output('risk_free_returns', 'children'),
     Output('risk_free_table', 'children'),
     Input('selected_portfolio', 'data'),
     Input('capital_allocation_line', 'clickData'),
-    prevent_inital_call = True)
-def update_capital_allocation_line(data, click):
-    p = 0 if click is None else click['points'][0]['pointNumber']
-    r = report.CapitalAllocation(data)
-    return (
-        r.capital_allocation_line(p),
-        r.expected_returns(p/20),
-        r.final_table(p/20)
-    )
+    State('plotly_template', 'data'))
 
 
 
 @relatorio_app.callback(
     Output('corr_timeline_modal', 'is_open'),
     Output('corr_timeline_title', 'children'),
-    Output('corr_timeline_chart', 'figure'),
-    Input({'ticker_a': ALL, 'ticker_b': ALL}, 'n_clicks'),
-    State('monthly_returns', 'data'),
+    Output('corr_timeline_data', 'data'),
+    Input('corr_matrix', 'clickData'),
+    Input('corr_timeline_chart', 'relayoutData'),
+    State('corr_timeline_data', 'data'),
+    State('report_period', 'value'),
     prevent_initial_call = True)
-def load_corr_timeline(tickers, data):
-    if all(click is None for click in tickers):
-        raise PreventUpdate
-    cc = dash.callback_context.triggered[0]['prop_id'].split('"')
-    fig = report.CorrelationTimeline(cc[3], cc[7])
-    
-    return (
-        True,
-        fig.title(),
-        fig.plot(data)
+def load_corr_timeline(click, relayout, current, period):
+    report = engine()
+    import timeline
+    cc = dash.callback_context.triggered[0]['prop_id']
+
+    # Ao abrir, o histórico completo é enviado em resolução reduzida. Ao
+    # aproximar, apenas o intervalo visível é enviado novamente.
+    if cc == 'corr_matrix.clickData':
+        if click is None:
+            raise PreventUpdate
+        point = click['points'][0]
+        fig = report.CorrelationTimeline(point['y'], point['x'])
+        start = end = None
+    else:
+        if current is None or relayout is None:
+            raise PreventUpdate
+        columns = current['columns']
+        fig = report.CorrelationTimeline(columns[0], columns[-1])
+        if 'xaxis.range[0]' in relayout:
+            start = relayout['xaxis.range[0]']
+            end = relayout['xaxis.range[1]']
+        elif 'xaxis.range' in relayout:
+            start, end = relayout['xaxis.range']
+        elif relayout.get('xaxis.autorange'):
+            start = end = None
+        else:
+            raise PreventUpdate
+
+    df = timeline.history(
+        [fig.ticker_a, fig.ticker_b],
+        start,
+        end,
+        years = period
     )
+    if cc == 'corr_matrix.clickData':
+        return True, fig.title(), fig.data(df)
+    return dash.no_update, dash.no_update, fig.data(df)
+
+
+
+relatorio_app.clientside_callback(
+    ClientsideFunction('diversificador', 'corr_timeline'),
+    Output('corr_timeline_chart', 'figure'),
+    Input('corr_timeline_data', 'data'),
+    State('plotly_template', 'data'))
 
 
 
@@ -245,6 +443,7 @@ app = DispatcherMiddleware(server, {
 
 
 if __name__ == '__main__':
+    warmup.start()
     run_simple(
         hostname = '0.0.0.0',
         port = cfg.PORT,
@@ -1,3 +1,7 @@
+import os
+
+
+
 NAME = 'Diversificador de Portfólio'
 PORT = 1000
 PLOTLY_TEMPLATE = 'plotly_white'
@@ -5,6 +9,91 @@ SECRET_KEY = 'DEV'
 
 
 
+# CACHE
+CACHE_DIR = os.environ.get('DIVERSIFICADOR_CACHE', 'cache')
+PRICE_PERIOD = 5            # Anos de histórico usados por padrão na análise
+PRICE_HISTORY = 10          # Anos de histórico armazenados de cada ticker
+PRICE_REFRESH = 60*60       # Segundos até buscar novas cotações de um ticker
+DOWNLOAD_WORKERS = 8        # Tickers coletados simultaneamente
+DOWNLOAD_TIMEOUT = 10       # Segundos de espera de cada requisição
+DOWNLOAD_RETRIES = 2        # Novas tentativas após uma falha
+DOWNLOAD_BACKOFF = 0.5      # Segundos de espera antes da primeira nova tentativa
+DOWNLOAD_DEADLINE = 60      # Segundos até desistir dos tickers pendentes
+SELIC_TTL = 24*60*60        # Segundos até atualizar a taxa SELIC
+DOLAR_TTL = 24*60*60        # Segundos até atualizar o câmbio do dólar
+TICKER_NEGATIVE_TTL = 24*60*60  # Segundos até consultar novamente um ticker inválido
+TICKER_WORKERS = 8          # Consultas simultâneas na validação em lote
+TICKER_BATCH_MAX = 50       # Tickers por consulta na validação em lote
+TICKER_INDEX = os.path.join('assets', 'tickers_b3.csv')    # Índice opcional
+JOB_WORKERS = 2             # Relatórios gerados simultaneamente por worker
+JOB_TIMEOUT = 5*60          # Segundos sem progresso até considerar falha
+JOB_RETENTION = 24*60*60    # Segundos até remover uma tarefa do banco
+REPORT_CACHE_SIZE = 32      # Relatórios mantidos em memória por worker
+REPORT_CACHE_DISK = True    # Gravar relatórios em disco
+REPORT_CACHE_DISK_SIZE = 1000   # Relatórios mantidos em disco
+
+
+
+# SERVIDOR
+SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 2))  # Processos
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))   # Threads por processo
+SERVER_TIMEOUT = 120        # Segundos até um worker travado ser reiniciado
+SERVER_PRELOAD = os.environ.get('SERVER_PRELOAD', '1') != '0'  # Carregar o app antes do fork
+SERVER_WARMUP = os.environ.get('SERVER_WARMUP', '1') != '0'    # Preencher os caches antes do fork
+SERVER_WARMUP_TIMEOUT = 15  # Segundos máximos de aquecimento dos caches
+
+
+
+# MOEDAS
+# Sufixos de tickers cotados em reais. Os demais são convertidos do dólar.
+BRL_SUFFIXES = ('.SA', '-BRL')
+# Sufixos de criptomoedas no Yahoo! Finance
+CRYPTO_SUFFIXES = ('-USD', '-BRL')
+
+
+
+# RELATÓRIO
+CORR_LABELS_MAX = 20        # Tickers até os quais a matriz exibe os valores
+CORR_MIN_OVERLAP = 20       # Dias em comum necessários para a correlação
+TIMELINE_POINTS = 400       # Pontos por ticker no histórico de comparação
+TIMELINE_CACHE_SIZE = 256   # Históricos de tickers mantidos em memória
+ROLLING_WINDOW = 63         # Dias úteis da correlação móvel do histórico
+REPORT_PERIODS = [1, 3, 5, 10]  # Janelas de análise disponíveis, em anos
+REPORT_FREQUENCIES = {      # Frequências dos retornos da otimização
+    'M': 'Mensal',
+    'W': 'Semanal',
+    'D': 'Diária'
+}
+
+
+
+# OTIMIZAÇÃO
+FRONTIER_POINTS = 100       # Máximo de portfólios amostrados na fronteira
+FRONTIER_ADAPTIVE = True    # Amostragem adaptativa (False: grade fixa)
+FRONTIER_TOLERANCE = 0.05   # Diferença máxima entre portfólios vizinhos
+COVARIANCE = 'sample'       # Estimador da covariância (report.COVARIANCE)
+COVARIANCE_FACTORS = 5      # Fatores do estimador 'factor'
+
+
+
+# RESTRIÇÕES DE ALOCAÇÃO
+WEIGHT_MIN = 0.0            # Peso mínimo de cada ticker
+WEIGHT_MAX = 1.0            # Peso máximo de cada ticker
+GROUP_CAPS = {}             # Peso máximo de cada grupo de report.GROUPS,
+                            # por exemplo {'crypto': 0.3, 'foreign': 0.4}
+MAX_ASSETS = None           # Máximo de tickers com peso em cada portfólio
+CARDINALITY_TIME = 2.0      # Segundos de busca local do limite de tickers
+
+
+
+# LOTE
+BATCH_FETCH = 200           # Tickers coletados por vez na carga do universo
+BATCH_CHUNK = 8             # Portfólios por tarefa enviada a cada processo
+BATCH_PENDING = 2           # Tarefas em andamento por processo
+BATCH_BUFFER = 10000        # Linhas acumuladas antes de gravar cada tabela
+
+
+
 # FONTS
 MONTSERRAT = {
     'href': 'https://fonts.googleapis.com/css2?family=Montserrat:wght@300;800&display=swap',
@@ -16,4 +105,4 @@ FONTAWESOME = {
     'rel': 'stylesheet',
     'integrity': 'sha384-50oBUHEmvpQ+1lW4y57PTFmhCaXp0ML5d60M1M7uH2+nqUivzIebhndOJK28anvf',
     'crossorigin': 'anonymous'
-}
\ No newline at end of file
+}
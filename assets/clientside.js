@@ -0,0 +1,285 @@
+// Decodifica um array gerado por `serialize.encode_array`.
+function decode_array(array) {
+    var types = {
+        float32: Float32Array,
+        float64: Float64Array,
+        int32: Int32Array
+    };
+    var bytes = atob(array.data);
+    var buffer = new Uint8Array(bytes.length);
+    for (var i = 0; i < bytes.length; i++) {
+        buffer[i] = bytes.charCodeAt(i);
+    }
+    return Array.from(new types[array.dtype](buffer.buffer));
+}
+
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+
+    diversificador: {
+
+        // Destaca o portfólio selecionado na Fronteira da Eficiência sem
+        // gerar o gráfico novamente no servidor. O `clickData` não é
+        // apagado quando um novo relatório é carregado, então um novo
+        // gráfico sempre destaca o primeiro portfólio, como o servidor.
+        highlight_portfolio: function(click, figure) {
+            if (!figure) {
+                return window.dash_clientside.no_update;
+            }
+
+            var triggered = window.dash_clientside.callback_context.triggered;
+            var reloaded = triggered.some(function(t) {
+                return t.prop_id === 'frontier_figure.data';
+            });
+
+            var selected = 0;
+            if (click && !reloaded) {
+                if (click.points[0].curveNumber !== 0) {
+                    return window.dash_clientside.no_update;
+                }
+                selected = click.points[0].pointNumber;
+            }
+
+            var trace = figure.data[0];
+            var color = [];
+            var size = [];
+            for (var i = 0; i < trace.x.length; i++) {
+                color.push(i === selected ? 'yellow' : 'cyan');
+                size.push(i === selected ? 12 : 8);
+            }
+
+            var marker = Object.assign({}, trace.marker, {
+                color: color,
+                size: size
+            });
+            var data = figure.data.slice();
+            data[0] = Object.assign({}, trace, {marker: marker});
+            return Object.assign({}, figure, {data: data});
+        },
+
+        // Gráfico de alocação do portfólio selecionado, a partir dos
+        // tickers e pesos de `report.allocations`.
+        allocation_pie: function(allocation, template) {
+            if (!allocation) {
+                return window.dash_clientside.no_update;
+            }
+            return {
+                data: [{
+                    type: 'pie',
+                    labels: allocation.labels,
+                    values: allocation.values,
+                    hole: 0.4,
+                    textinfo: 'label+percent',
+                    hoverinfo: 'skip'
+                }],
+                layout: {
+                    template: template,
+                    margin: {b: 0, t: 0}
+                }
+            };
+        },
+
+        // Capital Allocation Line, retorno esperado e tabela final de
+        // alocação, calculados a partir de `CapitalAllocation.payload`.
+        capital_allocation: function(payload, click, template) {
+            if (!payload) {
+                var no_update = window.dash_clientside.no_update;
+                return [no_update, no_update, no_update];
+            }
+
+            var steps = payload.steps;
+            var selected = 0;
+            if (click) {
+                if (click.points[0].curveNumber !== 0) {
+                    return [
+                        window.dash_clientside.no_update,
+                        window.dash_clientside.no_update,
+                        window.dash_clientside.no_update
+                    ];
+                }
+                selected = click.points[0].pointNumber;
+            }
+            var p = selected / steps;
+
+            function weigh(value, risk_free_rate, p) {
+                return p*risk_free_rate + (1-p)*value;
+            }
+
+            function percent(value, digits) {
+                return (100*value).toFixed(digits) + '%';
+            }
+
+            function component(type, children, props) {
+                return {
+                    type: type,
+                    namespace: 'dash_html_components',
+                    props: Object.assign({children: children}, props)
+                };
+            }
+
+            var razao = [];
+            var retorno = [];
+            var cml = [];
+            var text = [];
+            var color = [];
+            var size = [];
+            for (var i = 0; i <= steps; i++) {
+                var ra = i / steps;
+                var re = weigh(payload.expected_return, payload.selic, ra);
+                var ri = weigh(payload.risk, 0, ra);
+                razao.push(ra);
+                retorno.push(re);
+                if (payload.cml) {
+                    cml.push(payload.cml.risk_free + payload.cml.sharpe*ri);
+                }
+                text.push(
+                    '<b>Proporção de Renda Fixa:</b> ' + percent(ra, 0)
+                    + '<br><b>Retorno Esperado:</b> ' + (100*re).toFixed(1)
+                    + ' ± ' + percent(ri, 1) + ' a.m.'
+                );
+                color.push(i === selected ? 'yellow' : 'cyan');
+                size.push(i === selected ? 12 : 8);
+            }
+
+            var figure = {
+                data: [{
+                    type: 'scatter',
+                    x: razao,
+                    y: retorno,
+                    mode: 'lines+markers',
+                    hovertext: text,
+                    hoverinfo: 'text',
+                    marker: {
+                        size: size,
+                        color: color,
+                        opacity: 1,
+                        line: {color: 'blue', width: 2}
+                    },
+                    line: {color: 'blue', width: 3}
+                }],
+                layout: {
+                    template: template,
+                    margin: {b: 10, t: 10},
+                    xaxis: {
+                        tickformat: ',.0%',
+                        autorange: 'reversed',
+                        title: {text: 'Proporção de Renda Fixa'}
+                    },
+                    yaxis: {
+                        tickformat: ',.1%',
+                        title: {text: 'Retorno Esperado (% a.m.)'}
+                    }
+                }
+            };
+
+            if (payload.cml) {
+                figure.data.push({
+                    type: 'scatter',
+                    x: razao,
+                    y: cml,
+                    name: 'Capital Market Line',
+                    mode: 'lines',
+                    line: {color: 'blue', width: 1, dash: 'dash'},
+                    hoverinfo: 'skip'
+                });
+                figure.layout.showlegend = false;
+            }
+
+            var returns = [
+                component(
+                    'B',
+                    percent(retorno[selected], 1) + ' a.m.',
+                    {style: {'font-size': 24}}
+                ),
+                component(
+                    'Span',
+                    '(±' + percent(weigh(payload.risk, 0, p), 1) + ')',
+                    {style: {'font-size': 16}, className: 'ml-2'}
+                )
+            ];
+
+            var rows = [
+                component('Tr', [
+                    component('Td', 'Renda Fixa'),
+                    component('Td', percent(p, 1))
+                ])
+            ];
+            Object.keys(payload.weights).forEach(function(ticker) {
+                rows.push(component('Tr', [
+                    component('Td', ticker),
+                    component('Td', percent(weigh(
+                        payload.weights[ticker], 0, p
+                    ), 1))
+                ]));
+            });
+
+            return [figure, returns, rows];
+        },
+
+        // Timeline de cotações de um ou dois tickers, a partir do histórico
+        // codificado por `CorrelationTimeline.data`. Os dados chegam em
+        // resolução reduzida e são recarregados a cada zoom.
+        corr_timeline: function(payload, template) {
+            if (!payload) {
+                return window.dash_clientside.no_update;
+            }
+
+            var x = decode_array(payload.index).map(function(day) {
+                return day * 86400000;
+            });
+            var multi = payload.columns.length > 1;
+
+            var data = payload.columns.map(function(ticker) {
+                var y = decode_array(payload.data[ticker]);
+                if (multi) {
+                    // Normalizar histórico do ticker
+                    var min = Math.min.apply(null, y);
+                    var max = Math.max.apply(null, y);
+                    y = y.map(function(v) {
+                        return (v - min) / (max - min);
+                    });
+                }
+                return {
+                    type: 'scatter',
+                    x: x,
+                    y: y,
+                    name: ticker,
+                    hoverinfo: 'skip'
+                };
+            });
+
+            var layout = {
+                template: template,
+                margin: {b: 10, t: 10},
+                showlegend: false,
+                // Mantém o zoom quando o intervalo visível é recarregado
+                uirevision: payload.columns.join(),
+                xaxis: {type: 'date'},
+                yaxis: {visible: !multi}
+            };
+
+            // Correlação móvel dos retornos diários, no eixo da direita
+            if (multi && payload.rolling) {
+                data.push({
+                    type: 'scatter',
+                    x: x,
+                    y: decode_array(payload.rolling),
+                    name: 'Correlação móvel',
+                    yaxis: 'y2',
+                    line: {color: 'gray', width: 1}
+                });
+                layout.yaxis2 = {
+                    title: 'Correlação móvel',
+                    range: [-1, 1],
+                    overlaying: 'y',
+                    side: 'right',
+                    showgrid: false
+                };
+            }
+
+            return {data: data, layout: layout};
+        }
+
+    }
+
+});
@@ -0,0 +1,575 @@
+'''
+Análise de diversificação em lote, sem a interface web.
+
+Uso:
+    python batch.py CARTEIRAS [--output lote] [--format csv|parquet]
+                    [--workers N] [--period ANOS] [--freq M|W|D]
+                    [--lower PESO] [--upper PESO] [--max-assets N]
+                    [--cap GRUPO=PESO ...]
+
+O arquivo CARTEIRAS tem um portfólio por linha, com os tickers separados
+por espaços, vírgulas, ponto e vírgula ou hashtags (como na URL do app).
+Cada linha pode começar com um nome seguido de dois pontos, por exemplo
+`cliente42: PETR4.SA VALE3.SA BTC-USD`. Linhas sem nome são identificadas
+pelo número da linha.
+
+As cotações da união dos tickers de todas as linhas são coletadas uma única
+vez, e os retornos alinhados são compartilhados por todos os portfólios. Os
+portfólios são analisados em paralelo por um pool de processos e os
+resultados são gravados incrementalmente em três tabelas na pasta de
+saída:
+
+- `resumo`: portfólio de maior Sharpe Ratio e tempo de cada análise;
+- `fronteira`: retorno esperado, risco e Sharpe Ratio de cada portfólio da
+  fronteira eficiente;
+- `pesos`: pesos do portfólio de maior Sharpe Ratio.
+
+O formato Parquet depende do pacote opcional `pyarrow`.
+
+'''
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import csv
+from itertools import islice
+import os
+import re
+import time
+
+import pandas as pd
+
+import app_config as cfg
+import macro
+import optimizer
+import prices
+import report
+import stats
+
+
+
+# Colunas e tipos de cada tabela de resultados
+TABLES = {
+    'resumo': {
+        'portfolio': 'str',
+        'tickers': 'int',
+        'falhas': 'str',
+        'retorno_esperado': 'float',
+        'risco': 'float',
+        'sharpe': 'float',
+        'pontos': 'int',
+        'segundos': 'float',
+        'erro': 'str'
+    },
+    'fronteira': {
+        'portfolio': 'str',
+        'ponto': 'int',
+        'retorno_esperado': 'float',
+        'risco': 'float',
+        'sharpe': 'float'
+    },
+    'pesos': {
+        'portfolio': 'str',
+        'ticker': 'str',
+        'peso': 'float'
+    }
+}
+
+
+
+def read_portfolios(path:str):
+    '''
+    Lê o arquivo de portfólios linha a linha.
+
+    Parameters
+    ----------
+    path : str
+        Caminho do arquivo, com um portfólio por linha.
+
+    Yields
+    ------
+    str
+        Nome do portfólio ou, se a linha não tiver nome, o número da linha.
+    list of str
+        Tickers do portfólio, como em `report.parse_hashtags`.
+
+    --------------------------------------------------------------------------
+    '''
+
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            name, sep, text = line.partition(':')
+            if not sep:
+                name, text = str(number), name
+            tickers = report.parse_hashtags(re.sub(r'[\s,;]+', '#', text))
+            if tickers:
+                yield name.strip(), tickers
+
+
+
+class Universe:
+    '''
+    Cotações e retornos da união dos tickers de um lote, compartilhados por
+    todos os portfólios.
+
+    Como os retornos de cada ticker não dependem dos demais tickers, os
+    retornos de cada portfólio são extraídos das matrizes da união, sem
+    coletar ou recalcular nada por portfólio.
+
+    Parameters
+    ----------
+    tickers : iterable of str
+        Tickers de todos os portfólios do lote.
+    period : int, optional
+        Janela da análise, em anos. Se for None, usa
+        `app_config.PRICE_PERIOD`.
+    freq : str, default='M'
+        Frequência dos retornos usados na otimização: 'M', 'W' ou 'D'.
+    store : prices.PriceStore, optional
+        Armazenamento local das cotações. Se for None, usa o padrão.
+    source : prices.PriceSource, optional
+        Fonte das cotações. Se for None, usa o Yahoo! Finance.
+
+    Attributes
+    ----------
+    df : pandas.core.frame.DataFrame
+        Cotações diárias dos últimos `period` anos de cada ticker.
+    returns : pandas.core.frame.DataFrame
+        Retornos de cada ticker na frequência `freq`
+        (`report.period_returns`).
+    daily : pandas.core.frame.DataFrame
+        Retornos diários alinhados de cada ticker (`stats.daily_returns`).
+    failed : list of str
+        Tickers que não puderam ser coletados.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(
+            self,
+            tickers,
+            period: int = None,
+            freq: str = 'M',
+            store: prices.PriceStore = None,
+            source: prices.PriceSource = None
+        ):
+        self.period = period or cfg.PRICE_PERIOD
+        self.freq = freq
+        tickers = sorted(set(tickers))
+
+        # O prazo de `app_config.DOWNLOAD_DEADLINE` vale para cada parte
+        history = []
+        self.failed = []
+        for i in range(0, len(tickers), cfg.BATCH_FETCH):
+            df, failed = prices.get_history(
+                tickers[i:i+cfg.BATCH_FETCH],
+                store = store,
+                source = source
+            )
+            history.append(df)
+            self.failed += failed
+
+        df = pd.concat(history, axis=1).sort_index()
+        if df.empty:
+            raise ValueError(f'Nenhum ticker coletado: {", ".join(tickers)}')
+        start = df.index.max() - pd.DateOffset(years=self.period)
+        self.df = df[df.index > start].dropna(axis=1, how='all')
+
+        dolar = macro.get_dolar(self.freq)
+        self.returns = report.period_returns(
+            self.df,
+            dolar,
+            self.freq,
+            how = 'all'
+        )
+        self.daily = stats.daily_returns(self.df)
+
+
+    def report(
+            self,
+            tickers: list,
+            constraints: dict = None
+        ) -> report.Markowitz:
+        '''
+        Relatório de análise de diversificação de um portfólio do lote.
+
+        Parameters
+        ----------
+        tickers : list of str
+            Tickers do portfólio.
+        constraints : dict, optional
+            Restrições de alocação (ver `report.Markowitz`).
+
+        Returns
+        -------
+        report.Markowitz
+            Relatório de análise de diversificação.
+
+        ----------------------------------------------------------------------
+        '''
+
+        df = self.df.reindex(columns=tickers).dropna(axis=1, how='all')
+        if df.empty:
+            raise ValueError(f'Nenhum ticker coletado: {", ".join(tickers)}')
+        return report.Markowitz(
+            ''.join(f'#{t}' for t in tickers),
+            df = df,
+            period = self.period,
+            freq = self.freq,
+            constraints = constraints,
+            returns = self.returns,
+            daily = self.daily
+        )
+
+
+
+def analyze(
+        universe: Universe,
+        name: str,
+        tickers: list,
+        constraints: dict = None
+    ) -> dict:
+    '''
+    Analisa um portfólio e monta as linhas de cada tabela de resultados.
+
+    O portfólio de maior Sharpe Ratio é o portfólio de tangência ou, caso
+    nenhum ticker supere a taxa risk-free, o portfólio da fronteira de maior
+    Sharpe Ratio. Erros da análise são registrados no resumo, sem
+    interromper o lote.
+
+    Parameters
+    ----------
+    universe : Universe
+        Cotações e retornos compartilhados do lote.
+    name : str
+        Nome do portfólio.
+    tickers : list of str
+        Tickers do portfólio.
+    constraints : dict, optional
+        Restrições de alocação (ver `report.Markowitz`).
+
+    Returns
+    -------
+    dict
+        Linhas de cada tabela de `TABLES`.
+
+    --------------------------------------------------------------------------
+    '''
+
+    start = time.perf_counter()
+    try:
+        r = universe.report(tickers, constraints)
+    except Exception as e:
+        nan = float('nan')
+        summary = (name, len(tickers), '', nan, nan, nan, 0,
+            time.perf_counter() - start, str(e) or type(e).__name__)
+        return {'resumo': [summary], 'fronteira': [], 'pesos': []}
+
+    best = r.tangency
+    if best is None:
+        best = r.portfolios.loc[r.portfolios['Sharpe'].idxmax()]
+    weights = best[r.tickers]
+    weights = weights[weights > optimizer.HOLDING]
+
+    summary = (
+        name,
+        len(tickers),
+        ' '.join(r.failed),
+        *(float(best[m]) for m in report.METRICS),
+        len(r.portfolios),
+        time.perf_counter() - start,
+        None
+    )
+    frontier = [
+        (name, int(i), *(float(row[m]) for m in report.METRICS))
+        for i, row in r.portfolios[report.METRICS].iterrows()
+    ]
+    return {
+        'resumo': [summary],
+        'fronteira': frontier,
+        'pesos': [(name, t, float(w)) for t, w in weights.items()]
+    }
+
+
+
+# Universo e restrições de cada processo do pool, definidos uma única vez
+# por processo em `_init`
+_universe = None
+_constraints = None
+
+def _init(universe:Universe, constraints:dict):
+    global _universe, _constraints
+    _universe = universe
+    _constraints = constraints
+
+
+def _analyze_chunk(chunk:list) -> list:
+    return [analyze(_universe, n, t, _constraints) for n, t in chunk]
+
+
+
+def score(
+        universe: Universe,
+        portfolios,
+        workers: int = None,
+        constraints: dict = None
+    ):
+    '''
+    Analisa os portfólios em paralelo em um pool de processos.
+
+    Os portfólios são enviados em partes de `app_config.BATCH_CHUNK`, com
+    no máximo `app_config.BATCH_PENDING` partes em andamento por processo,
+    de forma que a memória usada não dependa do tamanho do lote. O universo
+    é enviado a cada processo uma única vez.
+
+    Parameters
+    ----------
+    universe : Universe
+        Cotações e retornos compartilhados do lote.
+    portfolios : iterable of tuple
+        Nome e tickers de cada portfólio, como em `read_portfolios`.
+    workers : int, optional
+        Quantidade de processos. Se for None, usa um processo por núcleo.
+        Com 1, os portfólios são analisados no próprio processo.
+    constraints : dict, optional
+        Restrições de alocação (ver `report.Markowitz`).
+
+    Yields
+    ------
+    dict
+        Linhas de cada tabela de `TABLES` para cada portfólio, na ordem de
+        conclusão.
+
+    --------------------------------------------------------------------------
+    '''
+
+    portfolios = iter(portfolios)
+    chunks = iter(lambda: list(islice(portfolios, cfg.BATCH_CHUNK)), [])
+
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        _init(universe, constraints)
+        for chunk in chunks:
+            yield from _analyze_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(
+            max_workers = workers,
+            initializer = _init,
+            initargs = (universe, constraints)
+        ) as pool:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= workers * cfg.BATCH_PENDING:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(pool.submit(_analyze_chunk, chunk))
+        for future in pending:
+            yield from future.result()
+
+
+
+class TableWriter:
+    '''
+    Grava as linhas de uma tabela de forma incremental, em CSV ou Parquet.
+
+    As linhas são acumuladas até `buffer` linhas e então gravadas no
+    arquivo (em Parquet, como um novo row group).
+
+    Parameters
+    ----------
+    path : str
+        Caminho do arquivo.
+    columns : dict
+        Tipo ('str', 'int' ou 'float') de cada coluna, na ordem das linhas.
+    fmt : str, default='csv'
+        Formato do arquivo: 'csv' ou 'parquet'.
+    buffer : int, optional
+        Linhas acumuladas antes de cada gravação. Se for None, usa
+        `app_config.BATCH_BUFFER`.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(
+            self,
+            path: str,
+            columns: dict,
+            fmt: str = 'csv',
+            buffer: int = None
+        ):
+        self.columns = columns
+        self.fmt = fmt
+        self.buffer = buffer or cfg.BATCH_BUFFER
+        self.rows = []
+
+        if fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            types = {'str': pa.string(), 'int': pa.int64(), 'float': pa.float64()}
+            self.schema = pa.schema([(c, types[t]) for c, t in columns.items()])
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(columns)
+
+
+    def write(self, rows:list):
+        self.rows += rows
+        if len(self.rows) >= self.buffer:
+            self.flush()
+
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            columns = zip(*self.rows)
+            self.writer.write_table(pa.Table.from_arrays(
+                [pa.array(c, type=f.type) for c, f in zip(columns, self.schema)],
+                schema = self.schema
+            ))
+        else:
+            self.writer.writerows(self.rows)
+            self.file.flush()
+        self.rows = []
+
+
+    def close(self):
+        self.flush()
+        if self.fmt == 'parquet':
+            self.writer.close()
+        else:
+            self.file.close()
+
+
+
+def run(
+        path: str,
+        output: str,
+        fmt: str = 'csv',
+        workers: int = None,
+        period: int = None,
+        freq: str = 'M',
+        constraints: dict = None,
+        store: prices.PriceStore = None,
+        source: prices.PriceSource = None
+    ) -> dict:
+    '''
+    Analisa todos os portfólios de um arquivo e grava os resultados.
+
+    O arquivo é lido duas vezes, uma para montar a união dos tickers e outra
+    para enviar os portfólios ao pool, de forma que os portfólios nunca
+    fiquem todos em memória.
+
+    Parameters
+    ----------
+    path : str
+        Caminho do arquivo de portfólios (ver `read_portfolios`).
+    output : str
+        Pasta onde são gravadas as tabelas de `TABLES`.
+    fmt : str, default='csv'
+        Formato das tabelas: 'csv' ou 'parquet'.
+    workers : int, optional
+        Quantidade de processos. Se for None, usa um processo por núcleo.
+    period : int, optional
+        Janela da análise, em anos. Se for None, usa
+        `app_config.PRICE_PERIOD`.
+    freq : str, default='M'
+        Frequência dos retornos usados na otimização: 'M', 'W' ou 'D'.
+    constraints : dict, optional
+        Restrições de alocação (ver `report.Markowitz`).
+    store : prices.PriceStore, optional
+        Armazenamento local das cotações. Se for None, usa o padrão.
+    source : prices.PriceSource, optional
+        Fonte das cotações. Se for None, usa o Yahoo! Finance.
+
+    Returns
+    -------
+    dict
+        Quantidade de portfólios analisados ('portfolios') e com erro
+        ('errors'), de tickers com cotações ('tickers') e lista de tickers
+        não coletados ('failed').
+
+    --------------------------------------------------------------------------
+    '''
+
+    os.makedirs(output, exist_ok=True)
+    writers = {
+        table: TableWriter(os.path.join(output, f'{table}.{fmt}'), columns, fmt)
+        for table, columns in TABLES.items()
+    }
+    count = errors = 0
+    try:
+        tickers = set()
+        for _, t in read_portfolios(path):
+            tickers.update(t)
+        universe = Universe(tickers, period, freq, store, source)
+
+        results = score(universe, read_portfolios(path), workers, constraints)
+        for result in results:
+            for table, rows in result.items():
+                writers[table].write(rows)
+            count += 1
+            errors += result['resumo'][0][-1] is not None
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return {
+        'portfolios': count,
+        'errors': errors,
+        'tickers': len(universe.df.columns),
+        'failed': universe.failed
+    }
+
+
+
+def _cap(text:str) -> tuple:
+    group, _, value = text.partition('=')
+    return group, float(value)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('portfolios')
+    parser.add_argument('--output', default='lote')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--period', type=int, default=None)
+    parser.add_argument('--freq', choices=list(cfg.REPORT_FREQUENCIES), default='M')
+    parser.add_argument('--lower', type=float, default=None)
+    parser.add_argument('--upper', type=float, default=None)
+    parser.add_argument('--max-assets', type=int, default=None)
+    parser.add_argument('--cap', type=_cap, action='append', default=[])
+    args = parser.parse_args()
+
+    constraints = {
+        'lower': args.lower,
+        'upper': args.upper,
+        'caps': dict(args.cap) or None,
+        'max_assets': args.max_assets
+    }
+    start = time.perf_counter()
+    result = run(
+        args.portfolios,
+        args.output,
+        fmt = args.format,
+        workers = args.workers,
+        period = args.period,
+        freq = args.freq,
+        constraints = {k: v for k, v in constraints.items() if v is not None}
+    )
+    print(
+        f'{result["portfolios"]} portfólios ({result["errors"]} com erro) '
+        f'e {result["tickers"]} tickers em '
+        f'{time.perf_counter() - start:.1f} s'
+    )
+    if result['failed']:
+        print(f'Tickers não coletados: {", ".join(result["failed"])}')
@@ -0,0 +1,739 @@
+'''
+Benchmarks do pipeline de relatórios.
+
+Uso:
+    python benchmark.py pipeline [--sizes 2 10 50 100 200]
+    python benchmark.py record TICKER [TICKER ...]
+    python benchmark.py frontier
+    python benchmark.py returns
+    python benchmark.py server
+    python benchmark.py imports
+    python benchmark.py payloads
+    python benchmark.py covariance [--sizes 50 200 500]
+    python benchmark.py constraints [--sizes 10 50 200]
+
+O benchmark `pipeline` roda sem acesso à rede: as cotações, a SELIC e o
+câmbio são lidos da pasta de fixtures (gravada com `record`) ou, caso ela
+não exista, gerados aleatoriamente. Os tempos de cada etapa são gravados em
+JSON no arquivo definido por `--output`.
+
+O benchmark `server` inicia o gunicorn com e sem `preload_app` e mede o
+tempo até a primeira resposta e a memória (RSS e PSS) de cada worker. O
+benchmark `imports` mede, com `python -X importtime`, o tempo de importação
+do app e dos módulos carregados apenas no primeiro relatório.
+
+O benchmark `covariance` compara os estimadores de `report.COVARIANCE` em
+retornos mensais aleatórios com mais tickers que meses: tempo de estimação,
+tempo de otimização, número de condição e estabilidade dos pesos entre duas
+janelas deslocadas em um mês (turnover do portfólio de tangência e do
+portfólio do meio da fronteira). O benchmark `constraints` mede os tempos
+de otimização da fronteira, do limite de tickers e do portfólio de
+tangência com diferentes restrições de alocação.
+
+'''
+
+import argparse
+import gzip
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import cvxopt as opt
+from cvxopt import solvers
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+import app_config as cfg
+import macro
+import optimizer
+import prices
+import report
+import serialize
+import stats
+import timeline
+
+
+
+def synthetic_returns(n:int, months:int=59, seed:int=0) -> np.ndarray:
+    '''
+    Gera retornos mensais aleatórios para `n` tickers (n x months).
+    '''
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0.01, 0.05, months)
+    beta = rng.uniform(0.5, 1.5, (n, 1))
+    noise = rng.normal(0.005, 0.08, (n, months))
+    return beta * factor + noise
+
+
+
+def synthetic_prices(n:int, years:int=5, seed:int=0) -> pd.DataFrame:
+    '''
+    Gera cotações diárias aleatórias para `n` tickers, metade da B3 e metade
+    cotada em dólar.
+    '''
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=pd.Timestamp.today(), periods=252*years)
+    values = 100 * np.exp(np.cumsum(
+        rng.normal(0.0003, 0.02, (len(index), n)),
+        axis = 0
+    ))
+    columns = [
+        f'T{i:03d}.SA' if i % 2 else f'T{i:03d}' for i in range(n)
+    ]
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+
+def synthetic_dolar(index:pd.DatetimeIndex) -> pd.DataFrame:
+    '''
+    Gera cotações mensais aleatórias do dólar cobrindo as datas de `index`.
+    '''
+    months = pd.date_range(index[0], index[-1] + pd.offsets.MonthEnd(), freq='M')
+    rng = np.random.default_rng(1)
+    usd = 5 * np.exp(np.cumsum(rng.normal(0, 0.03, len(months))))
+    return pd.DataFrame({'USD': usd}, index=months)
+
+
+
+def timeit(func, repeat:int=3) -> float:
+    '''
+    Menor tempo de execução, em segundos, entre `repeat` execuções.
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+
+def load_fixtures(args) -> tuple:
+    '''
+    Carrega as fixtures de cotações, SELIC e câmbio.
+
+    As datas são deslocadas em semanas inteiras para que a última cotação
+    caia na última semana, já que o histórico é filtrado a partir da data
+    atual, mantendo os dias da semana de cada cotação.
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        Cotações diárias de cada ticker.
+    float
+        Taxa SELIC anual, em porcentagem.
+    dict
+        Cotação diária do dólar, no formato 'YYYY-MM-DD'.
+    str
+        'recorded' ou 'synthetic'.
+
+    --------------------------------------------------------------------------
+    '''
+
+    path = os.path.join(args.fixtures, 'prices.csv')
+    if os.path.exists(path):
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        with open(os.path.join(args.fixtures, 'macro.json')) as f:
+            data = json.load(f)
+        selic, dolar, kind = data['selic'], data['dolar'], 'recorded'
+    else:
+        df = synthetic_prices(max(args.sizes), years=cfg.PRICE_HISTORY)
+        usd = synthetic_dolar(df.index)['USD'].reindex(df.index, method='bfill')
+        dolar = {f'{k:%Y-%m-%d}': v for k, v in usd.items()}
+        selic, kind = 10.0, 'synthetic'
+
+    today = pd.Timestamp.today().normalize()
+    shift = pd.Timedelta(weeks=(today - df.index[-1]).days // 7)
+    df.index = df.index + shift
+    days = pd.DatetimeIndex(list(dolar)) + shift
+    dolar = {f'{d:%Y-%m-%d}': v for d, v in zip(days, dolar.values())}
+
+    return df, selic, dolar, kind
+
+
+
+def record(args):
+    '''
+    Grava as cotações atuais dos tickers, a SELIC e o câmbio como fixtures.
+    '''
+    df, failed = prices.get_history(args.tickers)
+    if failed:
+        print(f'Tickers não coletados: {", ".join(failed)}')
+
+    os.makedirs(args.fixtures, exist_ok=True)
+    df.to_csv(os.path.join(args.fixtures, 'prices.csv'))
+
+    usd = macro.get_dolar('D')['USD']
+    data = {
+        'selic': 100 * ((1 + macro.get_selic())**12 - 1),
+        'dolar': {f'{k:%Y-%m-%d}': v for k, v in usd.items()}
+    }
+    with open(os.path.join(args.fixtures, 'macro.json'), 'w') as f:
+        json.dump(data, f)
+
+
+
+def build_figures(r:report.Markowitz) -> list:
+    '''
+    Gera os gráficos do relatório montados no servidor para o primeiro
+    portfólio.
+    '''
+    alloc = report.MarkowitzAllocation(r.portfolios, 0, r.allocations[0])
+    return [alloc.efficiency_frontier(r.tangency)]
+
+
+
+def figures_json(figures) -> list:
+    '''
+    Serializa os gráficos como no envio ao browser.
+    '''
+    return [pio.to_json(fig, validate=False) for fig in figures]
+
+
+
+def bench_pipeline(args):
+    df_all, selic, dolar, kind = load_fixtures(args)
+
+    # Isolar o cache do benchmark e preenchê-lo com as fixtures
+    cfg.CACHE_DIR = tempfile.mkdtemp()
+    macro.default_cache().get('selic', 0, lambda _: selic)
+    macro.default_cache().get('dolar_diario', 0, lambda _: dolar)
+    store = prices.SQLitePriceStore('benchmark')
+    source = prices.FrameSource(df_all)
+    risk_free = macro.get_selic()
+
+    results = []
+    print(f'Fixtures: {kind}')
+    print(f'{"n":>4} {"etapa":>12} {"segundos":>10}')
+    for n in [n for n in args.sizes if n <= df_all.shape[1]]:
+        tickers = sorted(df_all.columns[:n])
+        for ticker in tickers:
+            store.replace(ticker, df_all[ticker].dropna())
+            store.touch(ticker)
+            store.cover(ticker, cfg.PRICE_HISTORY)
+
+        hashtags = ''.join(f'#{t}' for t in tickers)
+        r = report.Markowitz(hashtags, store=store, source=source)
+        figures = [r.corr_matrix()] + build_figures(r)
+
+        stages = {
+            'fetch': lambda: prices.get_history(tickers, store, source),
+            'returns': lambda: report.period_returns(r.df, r.dolar),
+            'correlation': lambda: stats.Moments(
+                stats.daily_returns(r.df)
+            ).corr(),
+            'corr_matrix': r.corr_matrix,
+            'optimize': r.optimize,
+            'sharpe': lambda: r.sharpe_ratio(risk_free),
+            'covariance': lambda: report.COVARIANCE[cfg.COVARIANCE](
+                r.moments
+            ),
+            'tangency': lambda: optimizer.tangency_portfolio(
+                r.moments.cov().to_numpy(),
+                r.moments.mean().to_numpy(),
+                risk_free
+            ),
+            'window': lambda: r.window(1, 'W'),
+            'figures': lambda: build_figures(r),
+            'serialize': lambda: figures_json(figures)
+        }
+        for stage, func in stages.items():
+            elapsed = timeit(func, args.repeat)
+            results.append({'n': n, 'stage': stage, 'seconds': elapsed})
+            print(f'{n:>4} {stage:>12} {elapsed:>10.4f}')
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'fixtures': kind,
+            'repeat': args.repeat,
+            'results': results
+        }, f, indent=2)
+
+
+
+def legacy_frontier(cov, mean, mus) -> np.ndarray:
+    '''
+    Loop original de `Markowitz.optimize`, sem ponto inicial.
+    '''
+    n = len(mean)
+    S = opt.matrix(cov)
+    pbar = opt.matrix(mean.reshape(-1, 1))
+    G = -opt.matrix(np.eye(n))
+    h = opt.matrix(0.0, (n ,1))
+    A = opt.matrix(1.0, (1, n))
+    b = opt.matrix(1.0)
+    portfolios = [solvers.qp(mu*S, -pbar, G, h, A, b)['x'] for mu in mus]
+    return np.hstack([np.asarray(x) for x in portfolios]).T
+
+
+
+def legacy_returns(df, dolar) -> pd.DataFrame:
+    '''
+    Cálculo original dos retornos mensais em `Markowitz.__init__`.
+    '''
+    dolar = dolar.copy()
+    dolar.index = dolar.index.strftime('%Y-%m')
+    returns = df.groupby(df.index.strftime('%Y-%m')).last()
+    for col in returns:
+        if not col.endswith('.SA'):
+            temp = pd.concat([returns[col], dolar], axis=1, join='inner')
+            returns[col] = temp[col] * temp.USD
+    return returns.pct_change().dropna()
+
+
+
+def bench_returns(args):
+    print(f'{"n":>4} {"legacy":>10} {"vetorizado":>10} {"max |dr|":>10}')
+    for n in [10, 100, 500]:
+        df = synthetic_prices(n)
+        dolar = synthetic_dolar(df.index)
+        legacy = timeit(lambda: legacy_returns(df, dolar), args.repeat)
+        fast = timeit(lambda: report.period_returns(df, dolar), args.repeat)
+        diff = np.abs(
+            legacy_returns(df, dolar).to_numpy() \
+            - report.period_returns(df, dolar).to_numpy()
+        ).max()
+        print(f'{n:>4} {legacy:>10.4f} {fast:>10.4f} {diff:>10.2e}')
+
+
+
+def max_gap(cov, weights) -> float:
+    '''
+    Maior distância de risco entre portfólios vizinhos, como fração da
+    amplitude de risco da fronteira.
+    '''
+    risk = np.sqrt(np.einsum('ij,jk,ik->i', weights, cov, weights))
+    return np.abs(np.diff(risk)).max() / np.ptp(risk)
+
+
+
+def bench_frontier(args):
+    mus = optimizer.risk_aversion(cfg.FRONTIER_POINTS)
+    print(
+        f'{"n":>4} {"engine":>12} {"segundos":>10} {"max |dw|":>10}'
+        f' {"pontos":>7} {"max gap":>8}'
+    )
+    for n in [5, 20, 50]:
+        returns = synthetic_returns(n)
+        cov = np.cov(returns)
+        mean = returns.mean(axis=1)
+        reference = legacy_frontier(cov, mean, mus)
+
+        engines = {
+            'legacy': lambda: legacy_frontier(cov, mean, mus),
+            'frontier': lambda: optimizer.efficient_frontier(cov, mean, mus)
+        }
+        for name, func in engines.items():
+            elapsed = timeit(func, args.repeat)
+            weights = func()
+            diff = np.abs(weights - reference).max()
+            print(
+                f'{n:>4} {name:>12} {elapsed:>10.4f} {diff:>10.2e}'
+                f' {len(weights):>7} {max_gap(cov, weights):>8.3f}'
+            )
+
+        # A amostragem adaptativa usa outros coeficientes, então é
+        # comparada pela distância entre portfólios vizinhos
+        def adaptive():
+            return optimizer.adaptive_frontier(
+                cov,
+                mean,
+                budget = cfg.FRONTIER_POINTS,
+                tolerance = cfg.FRONTIER_TOLERANCE
+            )[1]
+        elapsed = timeit(adaptive, args.repeat)
+        weights = adaptive()
+        print(
+            f'{n:>4} {"adaptive":>12} {elapsed:>10.4f} {"-":>10}'
+            f' {len(weights):>7} {max_gap(cov, weights):>8.3f}'
+        )
+
+
+
+def turnover(a:np.ndarray, b:np.ndarray) -> float:
+    '''
+    Fração da carteira negociada para passar dos pesos `a` para `b`.
+    '''
+    return 0.5 * np.abs(a - b).sum()
+
+
+
+def bench_covariance(args):
+    mus = optimizer.risk_aversion(cfg.FRONTIER_POINTS)[::10]
+    risk_free = 0.005
+    print(
+        f'{"n":>4} {"estimador":>21} {"estimar":>8} {"otimizar":>9}'
+        f' {"condição":>9} {"turn tang":>9} {"turn meio":>9}'
+    )
+    for n in args.sizes:
+        returns = synthetic_returns(n, months=60).T
+        windows = [
+            stats.Moments(pd.DataFrame(returns[:-1])),
+            stats.Moments(pd.DataFrame(returns[1:]))
+        ]
+
+        for name, estimator in report.COVARIANCE.items():
+            elapsed = timeit(lambda: estimator(windows[0]), args.repeat)
+            solve = 0.0
+            portfolios = []
+            for moments in windows:
+                cov = estimator(moments)
+                mean = moments.mean().to_numpy()
+                if not isinstance(cov, stats.FactorCovariance):
+                    cov = cov.to_numpy()
+                start = time.perf_counter()
+                weights = optimizer.efficient_frontier(cov, mean, mus)
+                solve += time.perf_counter() - start
+                tangency = optimizer.tangency_portfolio(cov, mean, risk_free)
+                portfolios.append((tangency, weights[len(mus) // 2]))
+
+            (t0, m0), (t1, m1) = portfolios
+            tang = float('nan') if t0 is None or t1 is None \
+                else turnover(t0, t1)
+            cond = np.linalg.cond(estimator(windows[0]).to_numpy())
+            print(
+                f'{n:>4} {name:>21} {elapsed:>8.4f} {solve / 2:>9.4f}'
+                f' {cond:>9.1e} {tang:>9.3f} {turnover(m0, m1):>9.3f}'
+            )
+
+
+
+def bench_constraints(args):
+    scenarios = {
+        'long-only': {},
+        'upper 10%': {'upper': 0.1},
+        'foreign 40%': {'caps': {'foreign': 0.4}},
+        'max 10': {'max_assets': 10},
+        'todas': {
+            'upper': 0.1,
+            'caps': {'foreign': 0.4},
+            'max_assets': 10
+        }
+    }
+    print(
+        f'{"n":>4} {"restrições":>12} {"fronteira":>9} {"limite":>8}'
+        f' {"tangência":>9} {"pontos":>7} {"tickers":>7}'
+    )
+    for n in args.sizes:
+        tickers = list(synthetic_prices(n, years=1).columns)
+        returns = pd.DataFrame(synthetic_returns(n).T, columns=tickers)
+        moments = stats.Moments(returns)
+        cov = report.COVARIANCE[cfg.COVARIANCE](moments).to_numpy()
+        mean = moments.mean().to_numpy()
+
+        for name, spec in scenarios.items():
+            limits = report.allocation_constraints(tickers, **spec)
+
+            start = time.perf_counter()
+            mus, weights = optimizer.adaptive_frontier(
+                cov,
+                mean,
+                budget = cfg.FRONTIER_POINTS,
+                tolerance = cfg.FRONTIER_TOLERANCE,
+                constraints = limits
+            )
+            frontier = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if limits.max_assets is not None:
+                weights = optimizer.limit_holdings(
+                    cov,
+                    mean,
+                    mus,
+                    weights,
+                    limits,
+                    time_budget = cfg.CARDINALITY_TIME
+                )
+            cardinality = time.perf_counter() - start
+
+            start = time.perf_counter()
+            optimizer.tangency_portfolio(cov, mean, 0.005, limits)
+            tangency = time.perf_counter() - start
+
+            holdings = (weights > optimizer.HOLDING).sum(axis=1).max()
+            print(
+                f'{n:>4} {name:>12} {frontier:>9.4f} {cardinality:>8.4f}'
+                f' {tangency:>9.4f} {len(mus):>7} {holdings:>7}'
+            )
+
+
+
+def memory(pid:int) -> dict:
+    '''
+    RSS e PSS de um processo, em MB. O PSS divide as páginas compartilhadas
+    entre os processos que as usam.
+    '''
+    result = {}
+    files = {
+        'rss': (f'/proc/{pid}/status', 'VmRSS:'),
+        'pss': (f'/proc/{pid}/smaps_rollup', 'Pss:')
+    }
+    for key, (path, field) in files.items():
+        try:
+            with open(path) as f:
+                line = next(l for l in f if l.startswith(field))
+            result[key] = int(line.split()[1]) / 1024
+        except (OSError, StopIteration):
+            result[key] = None
+    return result
+
+
+
+def children(pid:int) -> list:
+    '''
+    PIDs dos processos filhos de um processo.
+    '''
+    pids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            if int(stat.rsplit(')', 1)[1].split()[1]) == pid:
+                pids.append(int(entry))
+    return pids
+
+
+
+def bench_server(args):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    results = []
+    print(
+        f'{"preload":>8} {"partida":>8} {"worker":>7}'
+        f' {"RSS MB":>8} {"PSS MB":>8}'
+    )
+    for preload in [False, True]:
+        env = dict(
+            os.environ,
+            PORT = str(port),
+            WEB_CONCURRENCY = str(args.workers),
+            SERVER_PRELOAD = '1' if preload else '0',
+            SERVER_WARMUP = '0',
+            DIVERSIFICADOR_CACHE = tempfile.mkdtemp()
+        )
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:app',
+                '--config', 'gunicorn.conf.py'],
+            env = env,
+            stdout = subprocess.DEVNULL,
+            stderr = subprocess.DEVNULL
+        )
+        try:
+            while True:
+                try:
+                    url = f'http://127.0.0.1:{port}/PyAjuda/'
+                    urllib.request.urlopen(url, timeout=1).read()
+                    break
+                except OSError:
+                    if proc.poll() is not None:
+                        raise RuntimeError('O gunicorn não iniciou')
+                    time.sleep(0.05)
+            cold_start = time.perf_counter() - start
+
+            # Acessar as páginas em todos os workers antes de medir
+            for _ in range(4 * args.workers):
+                for page in ['PyTickers', 'PyRelatorio', 'PyAjuda']:
+                    url = f'http://127.0.0.1:{port}/{page}/'
+                    urllib.request.urlopen(url, timeout=10).read()
+
+            workers = children(proc.pid)
+            usage = [memory(pid) for pid in workers]
+            for i, mem in enumerate(usage):
+                print(
+                    f'{str(preload):>8} {cold_start:>8.2f} {i:>7}'
+                    f' {mem["rss"]:>8.1f} {mem["pss"] or float("nan"):>8.1f}'
+                )
+            results.append({
+                'preload': preload,
+                'cold_start': cold_start,
+                'master': memory(proc.pid),
+                'workers': usage
+            })
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'workers': args.workers,
+            'results': results
+        }, f, indent=2)
+
+
+
+def import_times(code:str) -> list:
+    '''
+    Tempos de importação de um trecho de código, executado em um novo
+    interpretador com `-X importtime`.
+
+    Returns
+    -------
+    list of tuple
+        Módulo, profundidade, tempo próprio e tempo acumulado (em segundos)
+        de cada importação, na ordem de término.
+
+    --------------------------------------------------------------------------
+    '''
+
+    env = dict(os.environ, DIVERSIFICADOR_CACHE=tempfile.mkdtemp())
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env = env,
+        stderr = subprocess.PIPE,
+        universal_newlines = True,
+        check = True
+    )
+    times = []
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            own, total, name = line[len('import time:'):].split('|')
+            if own.strip().isdigit():
+                depth = (len(name) - len(name.lstrip()) - 1) // 2
+                times.append((
+                    name.strip(),
+                    depth,
+                    int(own) / 1e6,
+                    int(total) / 1e6
+                ))
+    return times
+
+
+
+def bench_imports(args):
+    import warmup
+
+    stages = {
+        'app': 'import app',
+        'engine': 'import app; import warmup; warmup.import_engine()'
+    }
+    results = {}
+    for stage, code in stages.items():
+        times = import_times(code)
+        # Módulos importados diretamente pelo app ou pelo código medido
+        top = [
+            (n, t) for n, depth, _, t in times
+            if depth <= 1 and n != 'app'
+        ]
+        results[stage] = {
+            'total': sum(own for _, _, own, _ in times),
+            'top': sorted(top, key=lambda x: -x[1])[:args.top]
+        }
+
+    print(f'{"etapa":>8} {"segundos":>10}')
+    for stage, data in results.items():
+        print(f'{stage:>8} {data["total"]:>10.3f}')
+
+    print()
+    print(f'Módulos mais lentos ({", ".join(warmup.ENGINE)} sob demanda):')
+    for stage, data in results.items():
+        for name, total in data['top']:
+            print(f'{stage:>8} {name:>24} {total:>10.3f}')
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results
+        }, f, indent=2)
+
+
+
+def bench_payloads(args):
+    '''
+    Compara o tamanho, em KB, dos dados enviados ao browser em JSON e no
+    formato colunar de `serialize`, sem e com gzip.
+    '''
+    df = synthetic_prices(max(args.sizes))
+
+    def sizes(text):
+        data = text.encode()
+        return len(data) / 1024, len(gzip.compress(data)) / 1024
+
+    print(f'{"n":>4} {"payload":>18} {"KB":>8} {"KB gzip":>8}')
+    for n in args.sizes:
+        data = df.iloc[:, :n]
+        fig = report.CorrelationTimeline(*data.columns[:2])
+        encoded = fig.data(data)
+        payloads = {
+            'frame to_json': data.to_json(),
+            'frame serialize': json.dumps(serialize.encode_frame(data)),
+            'timeline data': json.dumps(encoded),
+            'timeline lttb': json.dumps(fig.data(
+                timeline.downsample(
+                    data[list(data.columns[:2])].dropna(),
+                    cfg.TIMELINE_POINTS
+                )
+            ))
+        }
+        for name, text in payloads.items():
+            raw, compressed = sizes(text)
+            print(f'{n:>4} {name:>18} {raw:>8.1f} {compressed:>8.1f}')
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--fixtures', default='fixtures')
+    parser.add_argument('--output', default='bench_output.json')
+    subparsers = parser.add_subparsers(dest='stage', required=True)
+
+    pipeline = subparsers.add_parser('pipeline')
+    pipeline.add_argument(
+        '--sizes',
+        type = int,
+        nargs = '+',
+        default = [2, 10, 50, 100, 200]
+    )
+    pipeline.set_defaults(func=bench_pipeline)
+
+    recorder = subparsers.add_parser('record')
+    recorder.add_argument('tickers', nargs='+')
+    recorder.set_defaults(func=record)
+
+    subparsers.add_parser('frontier').set_defaults(func=bench_frontier)
+    subparsers.add_parser('returns').set_defaults(func=bench_returns)
+    subparsers.add_parser('server').set_defaults(func=bench_server)
+
+    covariance = subparsers.add_parser('covariance')
+    covariance.add_argument(
+        '--sizes',
+        type = int,
+        nargs = '+',
+        default = [50, 200, 500]
+    )
+    covariance.set_defaults(func=bench_covariance)
+
+    constraints = subparsers.add_parser('constraints')
+    constraints.add_argument(
+        '--sizes',
+        type = int,
+        nargs = '+',
+        default = [10, 50, 200]
+    )
+    constraints.set_defaults(func=bench_constraints)
+
+    payloads = subparsers.add_parser('payloads')
+    payloads.add_argument('--sizes', type=int, nargs='+', default=[2, 10, 50])
+    payloads.set_defaults(func=bench_payloads)
+
+    imports = subparsers.add_parser('imports')
+    imports.add_argument('--top', type=int, default=8)
+    imports.set_defaults(func=bench_imports)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,225 @@
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+
+import app_config as cfg
+
+
+
+def report_key(
+        tickers: list,
+        date,
+        period: int = None,
+        freq: str = None
+    ) -> str:
+    '''
+    Chave de conteúdo de um relatório.
+
+    Parameters
+    ----------
+    tickers : list of str
+        Tickers normalizados do relatório.
+    date : pandas.Timestamp
+        Data da última cotação disponível.
+    period : int, optional
+        Janela da análise, em anos.
+    freq : str, optional
+        Frequência dos retornos da análise.
+
+    Returns
+    -------
+    str
+        Hash SHA-1 dos tickers ordenados, da data e da janela.
+
+    --------------------------------------------------------------------------
+    '''
+
+    content = ','.join(sorted(tickers)) + f'@{date:%Y-%m-%d}'
+    if period is not None or freq is not None:
+        content += f'/{period}{freq}'
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+
+class ReportCache:
+    '''
+    Cache de relatórios no servidor, indexado pelo ID do relatório.
+
+    Os relatórios mais recentes ficam em memória com política de remoção LRU.
+    Opcionalmente, também são gravados em disco para que possam ser lidos
+    por outros workers ou após serem removidos da memória.
+
+    Parameters
+    ----------
+    maxsize : int
+        Quantidade máxima de relatórios em memória.
+    directory : str, optional
+        Pasta onde os relatórios são gravados. Se for None, o cache fica
+        apenas em memória.
+    disk_size : int, default=1000
+        Quantidade máxima de relatórios gravados em disco.
+
+    Attributes
+    ----------
+    hits : int
+        Quantidade de buscas encontradas no cache.
+    misses : int
+        Quantidade de buscas não encontradas no cache.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(
+            self,
+            maxsize: int,
+            directory: str = None,
+            disk_size: int = 1000
+        ):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.disk_size = disk_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+
+    def get(self, key:str):
+        '''
+        Busca um relatório no cache.
+
+        Parameters
+        ----------
+        key : str
+            ID do relatório.
+
+        Returns
+        -------
+        any
+            Relatório armazenado ou None, caso não esteja no cache.
+
+        ----------------------------------------------------------------------
+        '''
+
+        if key is None:
+            return None
+
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+
+        value = self._read(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+
+    def stats(self) -> dict:
+        '''
+        Estatísticas de uso do cache neste worker.
+
+        Returns
+        -------
+        dict
+            Quantidade de acertos, falhas e relatórios em memória.
+
+        ----------------------------------------------------------------------
+        '''
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'maxsize': self.maxsize
+            }
+
+
+    def put(self, key:str, value):
+        '''
+        Armazena um relatório no cache.
+
+        Parameters
+        ----------
+        key : str
+            ID do relatório.
+        value : any
+            Relatório que será armazenado.
+
+        ----------------------------------------------------------------------
+        '''
+
+        self._remember(key, value)
+        self._write(key, value)
+
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pickle')
+
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+
+    def _write(self, key, value):
+        if self.directory is None:
+            return
+
+        # Gravar em um arquivo temporário para que outros workers nunca
+        # leiam um relatório incompleto
+        path = self._path(key)
+        temp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+        self._prune()
+
+
+    def _prune(self):
+        files = [
+            f for f in os.scandir(self.directory) \
+            if f.name.endswith('.pickle')
+        ]
+        if len(files) <= self.disk_size:
+            return
+        files.sort(key=lambda f: f.stat().st_mtime)
+        for f in files[:len(files) - self.disk_size]:
+            try:
+                os.remove(f.path)
+            except OSError:
+                pass
+
+
+
+reports = ReportCache(
+    maxsize = cfg.REPORT_CACHE_SIZE,
+    directory = os.path.join(cfg.CACHE_DIR, 'reports') \
+        if cfg.REPORT_CACHE_DISK else None,
+    disk_size = cfg.REPORT_CACHE_DISK_SIZE
+)
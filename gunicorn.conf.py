@@ -0,0 +1,62 @@
+'''
+Configuração do gunicorn.
+
+O app é carregado no processo mestre antes do fork dos workers
+(`preload_app`), de forma que os módulos pesados (dash, plotly, pandas,
+cvxopt) e os layouts sejam importados uma única vez e compartilhados entre
+os workers por copy-on-write. Sem `preload_app`, os workers respondem
+assim que o app é importado e carregam os módulos de relatório em segundo
+plano.
+
+'''
+
+import gc
+import os
+
+import app_config as cfg
+
+
+
+bind = f'0.0.0.0:{os.environ.get("PORT", cfg.PORT)}'
+workers = cfg.SERVER_WORKERS
+threads = cfg.SERVER_THREADS
+worker_class = 'gthread' if cfg.SERVER_THREADS > 1 else 'sync'
+timeout = cfg.SERVER_TIMEOUT
+preload_app = cfg.SERVER_PRELOAD
+
+
+
+def when_ready(server):
+    '''
+    Com `preload_app`, importa os módulos de relatório, aquece os caches e
+    congela os objetos já carregados antes do fork.
+    '''
+
+    if not preload_app:
+        return
+
+    # Falhas no aquecimento não impedem o início do servidor
+    try:
+        import warmup
+        warmup.import_engine()
+        if cfg.SERVER_WARMUP:
+            warmup.prime_caches_within(cfg.SERVER_WARMUP_TIMEOUT)
+    except Exception:
+        server.log.exception('Falha no aquecimento do app')
+    finally:
+        # Sem o freeze, a coleta de lixo dos workers toca os objetos
+        # herdados do mestre e desfaz o compartilhamento das páginas de
+        # memória
+        gc.freeze()
+
+
+
+def post_worker_init(worker):
+    '''
+    Sem `preload_app`, cada worker importa os módulos de relatório em
+    segundo plano, respondendo às páginas leves enquanto isso.
+    '''
+
+    if not preload_app:
+        import warmup
+        warmup.start(caches=cfg.SERVER_WARMUP)
@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import time
+
+import app_config as cfg
+import storage
+
+
+
+class JobQueue:
+    '''
+    Fila de tarefas em segundo plano para geração de relatórios.
+
+    As tarefas rodam em um pool de threads do próprio worker, enquanto o
+    estado de cada tarefa (etapa, progresso, erro e resultado) fica em
+    SQLite, de forma que qualquer worker possa responder às consultas de
+    progresso.
+
+    Parameters
+    ----------
+    workers : int
+        Quantidade de tarefas executadas simultaneamente por worker.
+    name : str, default='jobs'
+        Nome do arquivo do banco.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, workers:int, name:str='jobs'):
+        self.conn = storage.connect(name)
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    stage TEXT,
+                    progress REAL,
+                    error TEXT,
+                    result TEXT,
+                    updated REAL
+                )
+            ''')
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+
+    @staticmethod
+    def job_key(content:str) -> str:
+        '''
+        ID da tarefa para um conteúdo. Requisições iguais compartilham a
+        mesma tarefa enquanto ela estiver em andamento ou for recente.
+        '''
+        return hashlib.sha1(content.encode()).hexdigest()
+
+
+    def submit(self, job_id:str, func) -> str:
+        '''
+        Agenda uma tarefa, a menos que ela já esteja em andamento ou tenha
+        sido concluída sem erros há menos de `app_config.PRICE_REFRESH`
+        segundos, de forma que novas cotações sejam consideradas. Tarefas
+        sem atualização há mais de `app_config.JOB_RETENTION` segundos são
+        removidas.
+
+        Parameters
+        ----------
+        job_id : str
+            ID da tarefa.
+        func : callable
+            Função que recebe uma função `progress(stage, fraction)` e
+            retorna o resultado da tarefa como texto.
+
+        Returns
+        -------
+        str
+            ID da tarefa.
+
+        ----------------------------------------------------------------------
+        '''
+
+        self._prune()
+        status = self.status(job_id)
+        if status is not None and status['error'] is None:
+            running = status['result'] is None
+            age = time.time() - status['updated']
+            if running or age < cfg.PRICE_REFRESH:
+                return job_id
+
+        self._update(
+            job_id,
+            stage = None,
+            progress = 0.0,
+            error = None,
+            result = None
+        )
+
+        def _progress(stage, fraction):
+            self._update(job_id, stage=stage, progress=fraction)
+
+        def _run():
+            try:
+                result = func(_progress)
+            except Exception as e:
+                self._update(job_id, error=str(e) or type(e).__name__)
+            else:
+                self._update(job_id, progress=1.0, result=result)
+
+        self.pool.submit(_run)
+        return job_id
+
+
+    def status(self, job_id:str):
+        '''
+        Estado atual de uma tarefa.
+
+        Parameters
+        ----------
+        job_id : str
+            ID da tarefa.
+
+        Returns
+        -------
+        dict or None
+            Etapa, progresso, erro, resultado e horário da última
+            atualização da tarefa, ou None caso a tarefa não exista. Tarefas
+            sem atualização há mais de `app_config.JOB_TIMEOUT` segundos são
+            consideradas falhas.
+
+        ----------------------------------------------------------------------
+        '''
+
+        row = self.conn.execute(
+            '''
+            SELECT stage, progress, error, result, updated
+            FROM jobs WHERE job_id = ?
+            ''',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        stage, progress, error, result, updated = row
+        if result is None and error is None \
+                and time.time() - updated > cfg.JOB_TIMEOUT:
+            error = 'Tempo esgotado'
+
+        return {
+            'stage': stage,
+            'progress': progress,
+            'error': error,
+            'result': result,
+            'updated': updated
+        }
+
+
+    def _prune(self):
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM jobs WHERE updated < ?',
+                (time.time() - cfg.JOB_RETENTION,)
+            )
+
+
+    def _update(self, job_id, **values):
+        values['updated'] = time.time()
+        columns = ', '.join(f'{k} = ?' for k in values)
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR IGNORE INTO jobs (job_id) VALUES (?)',
+                (job_id,)
+            )
+            self.conn.execute(
+                f'UPDATE jobs SET {columns} WHERE job_id = ?',
+                (*values.values(), job_id)
+            )
+
+
+
+queue = JobQueue(workers=cfg.JOB_WORKERS)
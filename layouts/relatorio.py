@@ -1,6 +1,7 @@
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
+import plotly.io as pio
 
 import app_config as cfg
 import utils
@@ -138,6 +139,50 @@ risk_free = html.Div([
 
 
 
+report_window = dbc.Row([
+
+    # Janela da análise, em anos
+    dbc.Col([
+        dbc.Label(
+            html.B('Janela')
+        ),
+        dbc.RadioItems(
+            id = 'report_period',
+            options = [
+                {'label': f'{y} ano' if y == 1 else f'{y} anos', 'value': y}
+                for y in cfg.REPORT_PERIODS
+            ],
+            value = cfg.PRICE_PERIOD,
+            inline = True
+        )
+    ],
+        width = 'auto'
+    ),
+
+    # Frequência dos retornos usados na otimização
+    dbc.Col([
+        dbc.Label(
+            html.B('Retornos')
+        ),
+        dbc.RadioItems(
+            id = 'report_freq',
+            options = [
+                {'label': label, 'value': freq}
+                for freq, label in cfg.REPORT_FREQUENCIES.items()
+            ],
+            value = 'M',
+            inline = True
+        )
+    ],
+        width = 'auto'
+    )
+
+],
+    className = 'mb-4'
+)
+
+
+
 renda_fixa_title = dbc.Row([
     dbc.Tooltip(
         'Consideramos a taxa SELIC como renda fixa livre de risco.',
@@ -162,17 +207,47 @@ renda_fixa_title = dbc.Row([
 
 layout = html.Div([
     dcc.Location(id='location'),
-    dcc.Store(id='monthly_returns'),
-    dcc.Store(id='portfolios_data'),
+    dcc.Store(id='report_id'),
+    dcc.Store(id='report_job'),
+    dcc.Store(id='previous_report', storage_type='session'),
+    dcc.Interval(
+        id = 'report_poll',
+        interval = 500,
+        disabled = True
+    ),
+    dcc.Store(id='frontier_figure'),
     dcc.Store(id='selected_portfolio'),
+    dcc.Store(id='portfolio_allocation'),
+    dcc.Store(
+        id = 'plotly_template',
+        data = pio.templates[cfg.PLOTLY_TEMPLATE].to_plotly_json()
+    ),
+    dcc.Store(id='corr_timeline_data'),
     corr_timeline_modal,
     jumbotron,
     utils.menu_ajuda('absolute'),
     dbc.Container([
 
+        report_window,
         html.H1('Matriz de Correlação'),
         html.Hr(style={'border': '1px solid blue'}),
-        dcc.Loading(html.Div(id='corr_table')),
+        html.Div([
+            html.Div(id='report_stage'),
+            dbc.Progress(
+                id = 'report_progress',
+                striped = True,
+                animated = True,
+                className = 'mt-2'
+            )
+        ],
+            id = 'report_loading'
+        ),
+        html.Div(id='corr_table'),
+        dcc.Graph(
+            id = 'corr_matrix',
+            config = utils.GRAPH_CONFIG,
+            style = {'display': 'none'}
+        ),
         
         html.H1('Renda Variável'),
         html.Hr(style={'border': '1px solid blue'}),
@@ -0,0 +1,168 @@
+import json
+import time
+
+import pandas as pd
+
+import app_config as cfg
+import storage
+
+
+
+class MacroCache:
+    '''
+    Cache com tempo de expiração para dados macroeconômicos.
+
+    Os valores são armazenados em SQLite, de forma que todos os workers do
+    gunicorn compartilhem o mesmo cache. Caso a atualização de um valor
+    expirado falhe, o valor antigo continua sendo servido.
+
+    Parameters
+    ----------
+    name : str, default='macro'
+        Nome do arquivo do banco.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, name:str='macro'):
+        self.conn = storage.connect(name)
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS macro (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated REAL
+                )
+            ''')
+
+
+    def get(self, key:str, ttl:float, refresh):
+        '''
+        Retorna o valor armazenado, atualizando-o caso tenha expirado.
+
+        Parameters
+        ----------
+        key : str
+            Nome do valor.
+        ttl : float
+            Tempo de expiração, em segundos.
+        refresh : callable
+            Função que recebe o valor antigo (ou None) e retorna o novo valor.
+            O valor deve ser serializável em JSON.
+
+        Returns
+        -------
+        any
+            Valor atualizado ou, em caso de falha na atualização, o último
+            valor armazenado.
+
+        ----------------------------------------------------------------------
+        '''
+
+        row = self.conn.execute(
+            'SELECT value, updated FROM macro WHERE key = ?',
+            (key,)
+        ).fetchone()
+
+        old = None if row is None else json.loads(row[0])
+        if row is not None and time.time() - row[1] < ttl:
+            return old
+
+        try:
+            value = refresh(old)
+        except Exception:
+            if row is None:
+                raise
+            return old
+
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO macro VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time())
+            )
+        return value
+
+
+
+_cache = None
+
+def default_cache() -> MacroCache:
+    '''
+    Cache padrão, compartilhado por todo o processo.
+    '''
+    global _cache
+    if _cache is None:
+        _cache = MacroCache()
+    return _cache
+
+
+
+def get_selic() -> float:
+    '''
+    Captura a atual taxa SELIC mensal para usá-la como taxa risk-free.
+    O valor é atualizado no máximo uma vez a cada `app_config.SELIC_TTL`.
+
+    Returns
+    -------
+    float
+        Taxa SELIC mensal.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def _refresh(_):
+        from DadosAbertosBrasil import selic
+        return float(selic(ultimos=1).loc[0,'valor'])
+
+    ao_ano = default_cache().get('selic', cfg.SELIC_TTL, _refresh)
+    return (ao_ano/100 + 1)**(1/12) - 1
+
+
+
+def get_dolar(freq:str='M') -> pd.DataFrame:
+    '''
+    Cotação do dólar no final de cada período, cobrindo os últimos
+    `app_config.PRICE_HISTORY` anos.
+
+    As cotações diárias ficam em cache e a atualização é incremental:
+    apenas os dados a partir do último dia armazenado são coletados
+    novamente. As demais frequências são derivadas das cotações diárias.
+
+    Parameters
+    ----------
+    freq : str, default='M'
+        Frequência das cotações: 'M' (mensal), 'W' (semanal) ou 'D'
+        (diária, em dias úteis).
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        Cotações do dólar, indexadas pelo último dia de cada período.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def _refresh(old):
+        from DadosAbertosBrasil import bacen
+        if old is None:
+            inicio = pd.Timestamp.today() \
+                - pd.DateOffset(years=cfg.PRICE_HISTORY, months=1)
+            inicio = f'{inicio:%Y-%m-%d}'
+        else:
+            inicio = max(old)
+        df = bacen.cambio(inicio=inicio, index=True)
+        new = {} if old is None else dict(old)
+        new.update({f'{k:%Y-%m-%d}': float(v) for k, v in df['USD'].items()})
+        return new
+
+    data = default_cache().get('dolar_diario', cfg.DOLAR_TTL, _refresh)
+    usd = pd.Series(data, dtype=float)
+    usd.index = pd.DatetimeIndex(usd.index)
+    usd = usd.sort_index()
+
+    if freq == 'D':
+        index = pd.bdate_range(usd.index.min(), usd.index.max())
+        usd = usd.reindex(index).ffill()
+    else:
+        usd = usd.resample(freq).last().ffill()
+    return usd.to_frame('USD')
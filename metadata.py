@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import os
+import threading
+import time
+
+import app_config as cfg
+import storage
+
+
+
+class TickerMetadata:
+    '''
+    Serviço de validação de tickers com cache local dos nomes.
+
+    Os nomes validados ficam em memória e em SQLite. Tickers desconhecidos
+    também são armazenados (cache negativo) e só são consultados novamente
+    após `app_config.TICKER_NEGATIVE_TTL`. Opcionalmente, um índice de
+    tickers da B3 pode ser pré-carregado de um arquivo CSV com as colunas
+    "ticker" e "name", validando os tickers mais comuns sem acesso à rede.
+
+    Parameters
+    ----------
+    name : str, default='metadata'
+        Nome do arquivo do banco.
+    index : str, optional
+        Caminho do índice de tickers em CSV.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, name:str='metadata', index:str=None):
+        self.conn = storage.connect(name)
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS tickers (
+                    ticker TEXT PRIMARY KEY,
+                    name TEXT,
+                    checked REAL
+                )
+            ''')
+        self._names = {}
+        self._lock = threading.Lock()
+        if index is not None and os.path.exists(index):
+            self.preload(index)
+
+
+    def preload(self, path:str):
+        '''
+        Carrega um índice de tickers em CSV para o cache em memória.
+
+        Parameters
+        ----------
+        path : str
+            Caminho do arquivo CSV com as colunas "ticker" e "name".
+
+        ----------------------------------------------------------------------
+        '''
+
+        with open(path, encoding='utf-8') as f:
+            names = {
+                row['ticker'].upper(): row['name'] \
+                for row in csv.DictReader(f)
+            }
+        with self._lock:
+            self._names.update(names)
+
+
+    def lookup(self, ticker:str):
+        '''
+        Valida um ticker e retorna seu nome.
+
+        Parameters
+        ----------
+        ticker : str
+            Ticker desejado.
+
+        Returns
+        -------
+        str or None
+            Nome do ticker ou None, caso o ticker não exista.
+
+        Raises
+        ------
+        Exception
+            Erros de rede ao consultar o Yahoo! Finance não são armazenados
+            em cache e são repassados.
+
+        ----------------------------------------------------------------------
+        '''
+
+        with self._lock:
+            if ticker in self._names:
+                return self._names[ticker]
+
+        row = self.conn.execute(
+            'SELECT name, checked FROM tickers WHERE ticker = ?',
+            (ticker,)
+        ).fetchone()
+        if row is not None:
+            name, checked = row
+            if name is not None:
+                with self._lock:
+                    self._names[ticker] = name
+                return name
+            if time.time() - checked < cfg.TICKER_NEGATIVE_TTL:
+                return None
+
+        name = self.fetch(ticker)
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO tickers VALUES (?, ?, ?)',
+                (ticker, name, time.time())
+            )
+        if name is not None:
+            with self._lock:
+                self._names[ticker] = name
+        return name
+
+
+    def fetch(self, ticker:str):
+        '''
+        Consulta o nome de um ticker no Yahoo! Finance.
+
+        Parameters
+        ----------
+        ticker : str
+            Ticker desejado.
+
+        Returns
+        -------
+        str or None
+            Nome do ticker ou None, caso o ticker não exista.
+
+        ----------------------------------------------------------------------
+        '''
+
+        # Importado sob demanda para não atrasar a inicialização do app
+        import yfinance
+        try:
+            info = yfinance.Ticker(ticker).info
+        except (KeyError, IndexError, ValueError):
+            return None
+        return info.get('longName') or info.get('shortName')
+
+
+    def validate(self, tickers:list) -> dict:
+        '''
+        Valida uma lista de tickers de uma vez, consultando os tickers fora
+        do cache em paralelo.
+
+        Parameters
+        ----------
+        tickers : list of str
+            Tickers desejados.
+
+        Returns
+        -------
+        dict
+            Nome de cada ticker, ou None para tickers não encontrados.
+
+        ----------------------------------------------------------------------
+        '''
+
+        def _lookup(ticker):
+            try:
+                return self.lookup(ticker)
+            except Exception:
+                return None
+
+        tickers = list(dict.fromkeys(tickers))
+        with ThreadPoolExecutor(max_workers=cfg.TICKER_WORKERS) as pool:
+            names = pool.map(_lookup, tickers)
+        return dict(zip(tickers, names))
+
+
+
+_service = None
+
+def default_service() -> TickerMetadata:
+    '''
+    Serviço padrão, compartilhado por todo o processo.
+    '''
+    global _service
+    if _service is None:
+        _service = TickerMetadata(index=cfg.TICKER_INDEX)
+    return _service
@@ -0,0 +1,705 @@
+import heapq
+import time
+
+import cvxopt as opt
+from cvxopt import solvers
+import numpy as np
+
+import stats
+
+
+
+solvers.options['show_progress'] = False
+
+
+
+# Peso mínimo para que um ticker seja considerado parte do portfólio
+HOLDING = 0.0001
+
+
+
+def risk_aversion(points:int) -> list:
+    '''
+    Grade de coeficientes de aversão ao risco usada para amostrar a
+    fronteira da eficiência.
+
+    Parameters
+    ----------
+    points : int
+        Quantidade de portfólios.
+
+    Returns
+    -------
+    list of float
+        Coeficientes de aversão ao risco em ordem crescente.
+
+    --------------------------------------------------------------------------
+    '''
+
+    return [10**(t/20-1) for t in range(points)]
+
+
+
+class Constraints:
+    '''
+    Restrições de alocação dos portfólios, por posição de cada ticker.
+
+    Além de vendas a descoberto proibidas e da soma dos pesos igual a 1, os
+    portfólios podem ter pesos mínimo e máximo por ticker, limites para a
+    soma dos pesos de grupos de tickers e um máximo de tickers com peso.
+    As matrizes esparsas G e h das restrições de desigualdade (Gw <= h) são
+    montadas uma única vez e reaproveitadas em todos os problemas da
+    fronteira.
+
+    Parameters
+    ----------
+    n : int
+        Quantidade de tickers.
+    lower : float or numpy.ndarray, default=0.0
+        Peso mínimo de cada ticker.
+    upper : float or numpy.ndarray, default=1.0
+        Peso máximo de cada ticker.
+    groups : numpy.ndarray, optional
+        Matriz booleana (g x n) com os tickers de cada grupo.
+    caps : numpy.ndarray, optional
+        Peso máximo de cada grupo (g).
+    max_assets : int, optional
+        Quantidade máxima de tickers com peso em cada portfólio, tratada
+        por `limit_holdings`.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(
+            self,
+            n: int,
+            lower = 0.0,
+            upper = 1.0,
+            groups: np.ndarray = None,
+            caps: np.ndarray = None,
+            max_assets: int = None
+        ):
+        self.n = n
+        self.lower = np.clip(np.broadcast_to(lower, n).astype(float), 0, 1)
+        self.upper = np.clip(np.broadcast_to(upper, n).astype(float), 0, 1)
+        self.groups = np.zeros((0, n), dtype=bool) if groups is None \
+            else np.asarray(groups, dtype=bool).reshape(-1, n)
+        self.caps = np.zeros(0) if caps is None \
+            else np.asarray(caps, dtype=float).ravel()
+        self.max_assets = max_assets
+        self._matrices = {}
+
+        # Com o limite de tickers, os tickers com peso mínimo precisam
+        # caber no limite e os `max_assets` maiores pesos máximos precisam
+        # somar ao menos 1
+        k = n if max_assets is None else max_assets
+        if (self.lower > self.upper).any() or self.lower.sum() > 1 + 1e-9 \
+                or np.sort(self.upper)[::-1][:k].sum() < 1 - 1e-9 \
+                or (self.lower > 0).sum() > k \
+                or (self.groups @ self.lower > self.caps + 1e-9).any():
+            raise ValueError('Restrições de alocação inviáveis')
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_matrices'] = {}
+        return state
+
+
+    def _rows(self) -> tuple:
+        '''
+        Linhas das restrições de desigualdade em formato de triplas
+        (valores, linhas, colunas) e o lado direito h.
+        '''
+
+        n = self.n
+        capped = np.flatnonzero(self.upper < 1)
+        g, j = np.nonzero(self.groups)
+        m = len(capped)
+        values = np.concatenate([-np.ones(n), np.ones(m), np.ones(len(g))])
+        rows = np.concatenate([np.arange(n), n + np.arange(m), n + m + g])
+        cols = np.concatenate([np.arange(n), capped, j])
+        h = np.concatenate([-self.lower, self.upper[capped], self.caps])
+        return values, rows, cols, h
+
+
+    def matrices(self, factors:int=0) -> tuple:
+        '''
+        Matrizes G (esparsa) e h das restrições Gw <= h.
+
+        Parameters
+        ----------
+        factors : int, default=0
+            Quantidade de fatores da forma fatorada, cujas exposições entram
+            como colunas vazias de G.
+
+        Returns
+        -------
+        cvxopt.spmatrix
+            Matriz G.
+        cvxopt.matrix
+            Vetor h.
+
+        ----------------------------------------------------------------------
+        '''
+
+        if factors not in self._matrices:
+            values, rows, cols, h = self._rows()
+            G = opt.spmatrix(
+                values.tolist(),
+                rows.tolist(),
+                cols.tolist(),
+                (len(h), self.n + factors)
+            )
+            self._matrices[factors] = (G, opt.matrix(h))
+        return self._matrices[factors]
+
+
+    def homogeneous(self, factors:int=0) -> tuple:
+        '''
+        Restrições Gw <= h reescritas para y = w / κ, com κ = 1'y > 0:
+        (G - h1')y <= 0. Usadas no problema do portfólio de tangência, em
+        que a soma de y não é fixa.
+
+        Parameters
+        ----------
+        factors : int, default=0
+            Quantidade de fatores da forma fatorada.
+
+        Returns
+        -------
+        cvxopt.matrix
+            Matriz G - h1'.
+        cvxopt.matrix
+            Vetor de zeros.
+
+        ----------------------------------------------------------------------
+        '''
+
+        values, rows, cols, h = self._rows()
+        G = np.zeros((len(h), self.n + factors))
+        np.add.at(G, (rows, cols), values)
+        G[:, :self.n] -= h[:, None]
+        return opt.matrix(G), opt.matrix(0.0, (len(h), 1))
+
+
+    def subset(self, positions) -> 'Constraints':
+        '''
+        Restrições do problema restrito aos tickers de `positions`, sem o
+        limite de quantidade de tickers.
+        '''
+
+        positions = np.asarray(positions)
+        return Constraints(
+            len(positions),
+            self.lower[positions],
+            self.upper[positions],
+            self.groups[:, positions],
+            self.caps
+        )
+
+
+
+def _problem(cov, mean, constraints:Constraints=None) -> tuple:
+    '''
+    Matrizes do problema de otimização de média-variância sem vendas a
+    descoberto: (S, -pbar, G, h, A, b). As restrições de desigualdade vêm
+    de `constraints` ou, se for None, apenas proíbem vendas a descoberto.
+
+    Com uma covariância de fatores (`stats.FactorCovariance`), o problema é
+    resolvido na forma fatorada, com os pesos w e as exposições f = B'w como
+    variáveis: minimizar μ(f'f + w'Dw)/2 - pbar'w sujeito a B'w - f = 0,
+    soma dos pesos igual a 1 e w >= 0. As matrizes S e G ficam esparsas e o
+    custo de cada iteração cresce com n·k² em vez de n³.
+    '''
+
+    n = len(mean)
+    if constraints is None:
+        constraints = Constraints(n)
+
+    if isinstance(cov, stats.FactorCovariance):
+        G, h = constraints.matrices(cov.loadings.shape[1])
+        S, q, A, b = _factor_problem(cov, -mean, np.ones(n), 1.0)
+        return S, q, G, h, A, b
+
+    G, h = constraints.matrices()
+    return (
+        opt.matrix(cov),
+        -opt.matrix(mean),
+        G,
+        h,
+        opt.matrix(1.0, (1, n)),
+        opt.matrix(1.0)
+    )
+
+
+
+def _factor_problem(cov, q, row, b:float) -> tuple:
+    '''
+    Matrizes (S, q, A, b) do problema na forma fatorada, com as variáveis
+    (w, f), termo linear `q`'w e restrição de igualdade `row`'w = `b`.
+    '''
+
+    B, d = cov.loadings, cov.specific
+    n, k = B.shape
+    return (
+        opt.spdiag(opt.matrix(np.concatenate([d, np.ones(k)]))),
+        opt.matrix(np.concatenate([np.ravel(q), np.zeros(k)])),
+        opt.matrix(np.block([
+            [np.reshape(row, (1, n)), np.zeros((1, k))],
+            [B.T, -np.eye(k)]
+        ])),
+        opt.matrix(np.concatenate([[b], np.zeros(k)]))
+    )
+
+
+
+def _start(cov, weights) -> opt.matrix:
+    '''
+    Ponto inicial do problema a partir dos pesos de um portfólio,
+    incluindo as exposições aos fatores na forma fatorada.
+    '''
+
+    weights = np.ascontiguousarray(weights, dtype=float)
+    if isinstance(cov, stats.FactorCovariance):
+        weights = np.concatenate([weights, cov.loadings.T @ weights])
+    return opt.matrix(weights)
+
+
+
+def _dense(cov) -> np.ndarray:
+    '''
+    Matriz de covariância completa, para o cálculo do risco.
+    '''
+
+    if isinstance(cov, stats.FactorCovariance):
+        return cov.to_numpy()
+    return np.ascontiguousarray(cov, dtype=float)
+
+
+
+def efficient_frontier(
+        cov: np.ndarray,
+        mean: np.ndarray,
+        mus: list,
+        initial: np.ndarray = None,
+        constraints: Constraints = None
+    ) -> np.ndarray:
+    '''
+    Calcula os portfólios da fronteira da eficiência para todos os
+    coeficientes de aversão ao risco de uma vez.
+
+    Cada coeficiente é resolvido de forma independente, sem partir da
+    solução vizinha, o que nos benchmarks não foi mais rápido. Para menos
+    problemas resolvidos, use `adaptive_frontier`.
+
+    Parameters
+    ----------
+    cov : numpy.ndarray or stats.FactorCovariance
+        Matriz de covariância dos retornos (n x n) ou modelo de fatores,
+        resolvido na forma fatorada.
+    mean : numpy.ndarray
+        Retorno médio de cada ticker (n).
+    mus : list of float
+        Coeficientes de aversão ao risco.
+    initial : numpy.ndarray, optional
+        Pesos iniciais de cada portfólio (len(mus) x n), por exemplo de uma
+        fronteira calculada anteriormente.
+    constraints : Constraints, optional
+        Restrições de alocação. Se for None, apenas vendas a descoberto são
+        proibidas. O limite de quantidade de tickers não é aplicado aqui
+        (ver `limit_holdings`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Pesos de cada portfólio (len(mus) x n), na mesma ordem de `mus`.
+
+    --------------------------------------------------------------------------
+    '''
+
+    if not isinstance(cov, stats.FactorCovariance):
+        cov = np.ascontiguousarray(cov, dtype=float)
+    mean = np.ascontiguousarray(mean, dtype=float).reshape(-1, 1)
+
+    S, q, G, h, A, b = _problem(cov, mean, constraints)
+    weights = np.empty((len(mus), len(mean)))
+    initvals = None
+    for i, mu in enumerate(mus):
+        # `np.float64 * cvxopt.matrix` gera um numpy.ndarray
+        mu = float(mu)
+        if initial is not None:
+            initvals = {'x': _start(cov, initial[i])}
+        sol = solvers.qp(mu*S, q, G, h, A, b, initvals=initvals)
+        weights[i] = np.asarray(sol['x']).ravel()[:len(mean)]
+
+    return weights
+
+
+
+def adaptive_frontier(
+        cov: np.ndarray,
+        mean: np.ndarray,
+        budget: int,
+        tolerance: float,
+        initial: tuple = None,
+        constraints: Constraints = None
+    ) -> tuple:
+    '''
+    Amostra a fronteira da eficiência de forma adaptativa.
+
+    A fronteira é resolvida primeiro em uma grade grossa de coeficientes de
+    aversão ao risco, cobrindo o mesmo intervalo de `risk_aversion(budget)`.
+    Em seguida, os intervalos entre portfólios vizinhos são refinados pelo
+    ponto médio (em escala logarítmica), começando pelos que mais diferem:
+    intervalos em que o conjunto de tickers com peso mudou, ou em que os
+    pesos ou o risco variam mais que `tolerance`. O refinamento termina
+    quando nenhum intervalo supera a tolerância ou quando `budget`
+    portfólios já foram resolvidos.
+
+    Parameters
+    ----------
+    cov : numpy.ndarray or stats.FactorCovariance
+        Matriz de covariância dos retornos (n x n) ou modelo de fatores,
+        resolvido na forma fatorada.
+    mean : numpy.ndarray
+        Retorno médio de cada ticker (n).
+    budget : int
+        Quantidade máxima de portfólios resolvidos.
+    tolerance : float
+        Maior diferença aceita entre portfólios vizinhos, tanto no peso de
+        cada ticker quanto no risco (como fração da amplitude de risco da
+        fronteira).
+    initial : tuple, optional
+        Coeficientes e pesos (len(mus) x n) de uma fronteira calculada
+        anteriormente. Cada problema parte dos pesos do coeficiente
+        anterior mais próximo.
+    constraints : Constraints, optional
+        Restrições de alocação. Se for None, apenas vendas a descoberto são
+        proibidas.
+
+    Returns
+    -------
+    numpy.ndarray
+        Coeficientes de aversão ao risco resolvidos, em ordem crescente.
+    numpy.ndarray
+        Pesos de cada portfólio (len(mus) x n), na mesma ordem.
+
+    --------------------------------------------------------------------------
+    '''
+
+    mean = np.ascontiguousarray(mean, dtype=float).reshape(-1, 1)
+    S, q, G, h, A, b = _problem(cov, mean, constraints)
+    dense = _dense(cov)
+    n = len(mean)
+
+    def solve(log_mu):
+        start = None
+        if initial is not None:
+            log_prev = np.log10(initial[0])
+            x = initial[1][np.abs(log_prev - log_mu).argmin()]
+            start = {'x': _start(cov, x)}
+        mu = float(10**log_mu)
+        sol = solvers.qp(mu*S, q, G, h, A, b, initvals=start)
+        w = np.asarray(sol['x']).ravel()[:n]
+        return w, np.sqrt(w @ dense @ w)
+
+    mus = risk_aversion(budget)
+    low, high = np.log10(mus[0]), np.log10(mus[-1])
+    solutions = {}
+    for log_mu in np.linspace(low, high, min(budget, 9)):
+        solutions[log_mu] = solve(log_mu)
+
+    # Intervalos menores que isso não são mais divididos
+    min_gap = (high - low) / (4*budget)
+
+    def score(lo, hi):
+        w_lo, r_lo = solutions[lo]
+        w_hi, r_hi = solutions[hi]
+        risks = [r for _, r in solutions.values()]
+        span = max(risks) - min(risks)
+        changed = ((w_lo > 1e-6) != (w_hi > 1e-6)).any()
+        diff = max(
+            np.abs(w_lo - w_hi).max(),
+            abs(r_lo - r_hi) / span if span > 0 else 0.0
+        )
+        return 2*diff if changed else diff
+
+    keys = sorted(solutions)
+    heap = [(-score(lo, hi), lo, hi) for lo, hi in zip(keys[:-1], keys[1:])]
+    heapq.heapify(heap)
+    while heap and len(solutions) < budget:
+        diff, lo, hi = heapq.heappop(heap)
+        if -diff <= tolerance or hi - lo < min_gap:
+            continue
+        mid = (lo + hi) / 2
+        solutions[mid] = solve(mid)
+        heapq.heappush(heap, (-score(lo, mid), lo, mid))
+        heapq.heappush(heap, (-score(mid, hi), mid, hi))
+
+    keys = sorted(solutions)
+    return (
+        np.array([10**k for k in keys]),
+        np.vstack([solutions[k][0] for k in keys])
+    )
+
+
+
+def tangency_portfolio(
+        cov: np.ndarray,
+        mean: np.ndarray,
+        risk_free: float,
+        constraints: Constraints = None
+    ) -> np.ndarray:
+    '''
+    Portfólio de maior Sharpe Ratio (portfólio de tangência), sem vendas a
+    descoberto.
+
+    O problema é reescrito com a mudança de variável y = w / (μ'w - rf),
+    que o transforma em um único problema quadrático convexo:
+    minimizar y'Σy sujeito a (μ - rf)'y = 1 e y >= 0. Os pesos são obtidos
+    normalizando y. As demais restrições de alocação são reescritas para y
+    (`Constraints.homogeneous`). Caso o portfólio tenha mais tickers que o
+    limite de `constraints`, o problema é resolvido novamente com as
+    seleções de `_selections`, que sempre incluem os tickers com peso
+    mínimo positivo, mantendo a de maior Sharpe Ratio.
+
+    Parameters
+    ----------
+    cov : numpy.ndarray or stats.FactorCovariance
+        Matriz de covariância dos retornos (n x n) ou modelo de fatores,
+        resolvido na forma fatorada.
+    mean : numpy.ndarray
+        Retorno médio de cada ticker (n).
+    risk_free : float
+        Taxa de retorno livre de risco.
+    constraints : Constraints, optional
+        Restrições de alocação. Se for None, apenas vendas a descoberto são
+        proibidas.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Pesos do portfólio de tangência (n), ou None caso nenhum ticker
+        tenha retorno médio acima da taxa livre de risco ou as restrições
+        não possam ser atendidas.
+
+    --------------------------------------------------------------------------
+    '''
+
+    excess = np.ascontiguousarray(mean, dtype=float).ravel() - risk_free
+    if not (excess > 0).any():
+        return None
+
+    n = len(excess)
+    if constraints is None:
+        constraints = Constraints(n)
+    if isinstance(cov, stats.FactorCovariance):
+        S, q, A, b = _factor_problem(cov, np.zeros(n), excess, 1.0)
+        G, h = constraints.homogeneous(cov.loadings.shape[1])
+    else:
+        S = opt.matrix(np.ascontiguousarray(cov, dtype=float))
+        q = opt.matrix(0.0, (n, 1))
+        A = opt.matrix(excess.reshape(1, -1))
+        b = opt.matrix(1.0)
+        G, h = constraints.homogeneous()
+    try:
+        sol = solvers.qp(S, q, G, h, A, b)
+    except ValueError:
+        return None
+    if sol['status'] != 'optimal':
+        return None
+
+    y = np.clip(np.asarray(sol['x']).ravel()[:n], 0, None)
+    weights = y / y.sum()
+
+    k = constraints.max_assets
+    if k is not None and (weights > HOLDING).sum() > k:
+        dense = _dense(cov)
+        best, sharpe = None, -np.inf
+        for selection in _selections(weights, constraints):
+            positions = np.array(selection)
+            try:
+                limits = constraints.subset(positions)
+            except ValueError:
+                continue
+            sub = tangency_portfolio(
+                _subset(cov, positions),
+                excess[positions] + risk_free,
+                risk_free,
+                limits
+            )
+            if sub is None:
+                continue
+            w = np.zeros(n)
+            w[positions] = sub
+            ratio = (w @ excess) / np.sqrt(w @ dense @ w)
+            if ratio > sharpe:
+                best, sharpe = w, ratio
+        return best
+    return weights
+
+
+
+def _selections(weights:np.ndarray, constraints:Constraints) -> list:
+    '''
+    Seleções iniciais de `constraints.max_assets` tickers: os tickers com
+    peso mínimo positivo, que sempre fazem parte da seleção, completados
+    pelos demais tickers de maior peso em `weights` ou, como alternativa,
+    pelos de maior peso máximo, para que os pesos possam somar 1 mesmo
+    quando os tickers de maior peso têm um peso máximo baixo.
+    '''
+
+    required = np.flatnonzero(constraints.lower > 0)
+    free = np.flatnonzero(constraints.lower <= 0)
+    m = constraints.max_assets - len(required)
+    orders = [
+        np.argsort(-weights[free], kind='stable'),
+        np.lexsort((-weights[free], -constraints.upper[free]))
+    ]
+    selections = []
+    for order in orders:
+        selection = tuple(np.sort(np.concatenate([required, free[order[:m]]])))
+        if selection not in selections:
+            selections.append(selection)
+    return selections
+
+
+
+def _subset(cov, positions):
+    '''
+    Covariância restrita aos tickers de `positions`.
+    '''
+
+    if isinstance(cov, stats.FactorCovariance):
+        return stats.FactorCovariance(
+            cov.loadings[positions],
+            cov.specific[positions]
+        )
+    return cov[np.ix_(positions, positions)]
+
+
+
+def limit_holdings(
+        cov: np.ndarray,
+        mean: np.ndarray,
+        mus: list,
+        weights: np.ndarray,
+        constraints: Constraints,
+        time_budget: float
+    ) -> np.ndarray:
+    '''
+    Limita a quantidade de tickers com peso em cada portfólio da fronteira
+    a `constraints.max_assets`, com uma busca local a partir da fronteira
+    sem o limite.
+
+    Para cada portfólio com tickers demais, o problema é resolvido apenas
+    com as seleções de `_selections` e com os tickers escolhidos no
+    portfólio vizinho, mantendo a melhor solução. Seleções inviáveis são
+    descartadas. Em seguida, enquanto houver tempo, o ticker de menor peso
+    é trocado pelo ticker de fora com maior ganho marginal na função
+    objetivo, até que a troca não melhore o portfólio. Tickers com peso
+    mínimo positivo nunca são trocados. Esgotado `time_budget`, os
+    portfólios restantes usam apenas a primeira etapa.
+
+    Parameters
+    ----------
+    cov : numpy.ndarray or stats.FactorCovariance
+        Matriz de covariância dos retornos (n x n) ou modelo de fatores.
+    mean : numpy.ndarray
+        Retorno médio de cada ticker (n).
+    mus : list of float
+        Coeficientes de aversão ao risco de cada portfólio.
+    weights : numpy.ndarray
+        Pesos dos portfólios sem o limite (len(mus) x n).
+    constraints : Constraints
+        Restrições de alocação, com o limite de tickers em `max_assets`.
+    time_budget : float
+        Tempo máximo da busca local, em segundos.
+
+    Returns
+    -------
+    numpy.ndarray
+        Pesos de cada portfólio (len(mus) x n). Portfólios para os quais
+        nenhuma seleção de tickers atende as restrições mantêm os pesos
+        sem o limite.
+
+    --------------------------------------------------------------------------
+    '''
+
+    k = constraints.max_assets
+    mean = np.ascontiguousarray(mean, dtype=float).ravel()
+    dense = _dense(cov)
+    deadline = time.perf_counter() + time_budget
+    problems = {}
+
+    def solve(selection, mu):
+        # Uma seleção pode ser inviável mesmo com as restrições viáveis
+        if selection not in problems:
+            positions = np.array(selection)
+            try:
+                limits = constraints.subset(positions)
+            except ValueError:
+                problems[selection] = None
+            else:
+                problems[selection] = _problem(
+                    _subset(cov, positions),
+                    mean[positions].reshape(-1, 1),
+                    limits
+                )
+        if problems[selection] is None:
+            return None, np.inf
+        S, q, G, h, A, b = problems[selection]
+        try:
+            sol = solvers.qp(mu*S, q, G, h, A, b)
+        except ValueError:
+            return None, np.inf
+        if sol['status'] != 'optimal':
+            return None, np.inf
+        w = np.zeros(len(mean))
+        w[list(selection)] = np.asarray(sol['x']).ravel()[:len(selection)]
+        return w, mu/2 * w @ dense @ w - mean @ w
+
+    result = np.array(weights, dtype=float, copy=True)
+    previous = None
+    for i, (mu, relaxed) in enumerate(zip(mus, weights)):
+        mu = float(mu)
+        if (relaxed > HOLDING).sum() <= k:
+            previous = None
+            continue
+
+        candidates = set(_selections(relaxed, constraints))
+        if previous is not None:
+            candidates.add(previous)
+        best, w, value = None, None, np.inf
+        for selection in candidates:
+            w_new, value_new = solve(selection, mu)
+            if value_new < value:
+                best, w, value = selection, w_new, value_new
+
+        # Troca o ticker de menor peso pelo de maior ganho marginal
+        while best is not None and time.perf_counter() < deadline:
+            gain = mean - mu * dense @ w
+            held = np.array(best)
+            # Tickers com peso mínimo positivo nunca saem da seleção
+            removable = held[constraints.lower[held] <= 0]
+            if not len(removable):
+                break
+            out = removable[w[removable].argmin()]
+            outside = np.setdiff1d(np.arange(len(mean)), held)
+            if not len(outside):
+                break
+            inn = outside[gain[outside].argmax()]
+            if gain[inn] <= gain[out]:
+                break
+            selection = tuple(np.sort(np.append(held[held != out], inn)))
+            w_new, value_new = solve(selection, mu)
+            if value_new >= value - 1e-12:
+                break
+            best, w, value = selection, w_new, value_new
+
+        if best is not None:
+            result[i] = w
+        previous = best
+
+    return result
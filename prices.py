@@ -0,0 +1,499 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import time
+
+import numpy as np
+import pandas as pd
+
+import app_config as cfg
+import storage
+
+
+
+def empty(ticker:str) -> pd.Series:
+    '''
+    Série de cotações vazia para tickers sem histórico.
+    '''
+    return pd.Series(
+        dtype = float,
+        index = pd.DatetimeIndex([]),
+        name = ticker
+    )
+
+
+
+class PriceSource:
+    '''
+    Fonte de cotações diárias. Subclasses devem implementar o método
+    `fetch`, o que permite trocar o Yahoo! Finance por uma fonte local.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def fetch(self, ticker:str, start=None) -> pd.Series:
+        '''
+        Coleta as cotações de fechamento de um ticker.
+
+        Parameters
+        ----------
+        ticker : str
+            Ticker desejado.
+        start : pandas.Timestamp, optional
+            Primeira data desejada. Se for None, coleta todo o período
+            definido em `app_config.PRICE_HISTORY`.
+
+        Returns
+        -------
+        pandas.core.series.Series
+            Cotações de fechamento indexadas por data.
+
+        ----------------------------------------------------------------------
+        '''
+
+        raise NotImplementedError
+
+
+
+class YahooSource(PriceSource):
+    '''
+    Coleta as cotações ajustadas da API do Yahoo! Finance.
+
+    Parameters
+    ----------
+    timeout : float, optional
+        Tempo máximo de espera de cada requisição, em segundos.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, timeout:float=None):
+        self.timeout = timeout
+
+
+    def fetch(self, ticker:str, start=None) -> pd.Series:
+        # Importado sob demanda para não atrasar a inicialização do app
+        import yfinance
+        t = yfinance.Ticker(ticker)
+        if start is None:
+            df = t.history(
+                period = f'{cfg.PRICE_HISTORY}y',
+                auto_adjust = True,
+                timeout = self.timeout
+            )
+        else:
+            df = t.history(
+                start = start.strftime('%Y-%m-%d'),
+                auto_adjust = True,
+                timeout = self.timeout
+            )
+
+        if df.empty:
+            return empty(ticker)
+
+        ds = df['Close'].dropna()
+        ds.index = pd.DatetimeIndex(ds.index)
+        if ds.index.tz is not None:
+            ds.index = ds.index.tz_localize(None)
+        ds.name = ticker
+        return ds
+
+
+
+class FrameSource(PriceSource):
+    '''
+    Fonte local de cotações a partir de um DataFrame, usada em benchmarks e
+    testes no lugar do Yahoo! Finance.
+
+    Parameters
+    ----------
+    df : pandas.core.frame.DataFrame
+        Cotações diárias com uma coluna por ticker.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, df:pd.DataFrame):
+        self.df = df
+
+
+    def fetch(self, ticker:str, start=None) -> pd.Series:
+        if ticker not in self.df.columns:
+            return empty(ticker)
+        ds = self.df[ticker].dropna()
+        if start is not None:
+            ds = ds[ds.index >= start]
+        return ds.rename(ticker)
+
+
+
+class PriceStore:
+    '''
+    Armazenamento local do histórico de cotações de cada ticker.
+    Subclasses devem implementar os métodos `load`, `save`, `replace`,
+    `checked`, `touch`, `coverage` e `cover`.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def load(self, ticker:str) -> pd.Series:
+        '''
+        Carrega o histórico armazenado de um ticker. Retorna uma série vazia
+        caso o ticker não esteja armazenado.
+        '''
+        raise NotImplementedError
+
+
+    def save(self, ticker:str, ds:pd.Series):
+        '''
+        Adiciona (ou sobrescreve) as cotações de `ds` ao histórico do ticker.
+        '''
+        raise NotImplementedError
+
+
+    def replace(self, ticker:str, ds:pd.Series):
+        '''
+        Substitui todo o histórico do ticker pelas cotações de `ds`.
+        '''
+        raise NotImplementedError
+
+
+    def checked(self, ticker:str):
+        '''
+        Timestamp UNIX da última consulta à fonte de dados para o ticker, ou
+        None se o ticker nunca foi consultado.
+        '''
+        raise NotImplementedError
+
+
+    def touch(self, ticker:str):
+        '''
+        Registra que o ticker acabou de ser consultado na fonte de dados.
+        '''
+        raise NotImplementedError
+
+
+    def coverage(self, ticker:str):
+        '''
+        Anos de histórico pedidos na última coleta completa do ticker, ou
+        None se o ticker nunca foi coletado por completo.
+        '''
+        raise NotImplementedError
+
+
+    def cover(self, ticker:str, years:int):
+        '''
+        Registra uma coleta completa de `years` anos de histórico do ticker.
+        '''
+        raise NotImplementedError
+
+
+
+class SQLitePriceStore(PriceStore):
+    '''
+    Armazena as cotações em um banco SQLite na pasta de cache.
+
+    Parameters
+    ----------
+    name : str, default='prices'
+        Nome do arquivo do banco.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, name:str='prices'):
+        self.conn = storage.connect(name)
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS prices (
+                    ticker TEXT,
+                    date TEXT,
+                    close REAL,
+                    PRIMARY KEY (ticker, date)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS checked (
+                    ticker TEXT PRIMARY KEY,
+                    timestamp REAL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS coverage (
+                    ticker TEXT PRIMARY KEY,
+                    years INTEGER
+                )
+            ''')
+
+
+    def load(self, ticker:str) -> pd.Series:
+        rows = self.conn.execute(
+            'SELECT date, close FROM prices WHERE ticker = ? ORDER BY date',
+            (ticker,)
+        ).fetchall()
+        if not rows:
+            return empty(ticker)
+        dates, closes = zip(*rows)
+        return pd.Series(
+            closes,
+            index = pd.DatetimeIndex(dates),
+            name = ticker,
+            dtype = float
+        )
+
+
+    def save(self, ticker:str, ds:pd.Series):
+        rows = [
+            (ticker, date.strftime('%Y-%m-%d'), float(close))
+            for date, close in ds.dropna().items()
+        ]
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO prices VALUES (?, ?, ?)',
+                rows
+            )
+
+
+    def replace(self, ticker:str, ds:pd.Series):
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM prices WHERE ticker = ?',
+                (ticker,)
+            )
+        self.save(ticker, ds)
+
+
+    def checked(self, ticker:str):
+        row = self.conn.execute(
+            'SELECT timestamp FROM checked WHERE ticker = ?',
+            (ticker,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+
+    def touch(self, ticker:str):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO checked VALUES (?, ?)',
+                (ticker, time.time())
+            )
+
+
+    def coverage(self, ticker:str):
+        row = self.conn.execute(
+            'SELECT years FROM coverage WHERE ticker = ?',
+            (ticker,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+
+    def cover(self, ticker:str, years:int):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO coverage VALUES (?, ?)',
+                (ticker, years)
+            )
+
+
+
+_store = None
+_source = None
+_pool = None
+
+def default_store() -> PriceStore:
+    '''
+    Armazenamento padrão, compartilhado por todo o processo.
+    '''
+    global _store
+    if _store is None:
+        _store = SQLitePriceStore()
+    return _store
+
+
+def default_source() -> PriceSource:
+    '''
+    Fonte de dados padrão, compartilhada por todo o processo.
+    '''
+    global _source
+    if _source is None:
+        _source = YahooSource(timeout=cfg.DOWNLOAD_TIMEOUT)
+    return _source
+
+
+def download_pool() -> ThreadPoolExecutor:
+    '''
+    Pool de threads usado para coletar os tickers em paralelo.
+    '''
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=cfg.DOWNLOAD_WORKERS)
+    return _pool
+
+
+
+def fetch(source:PriceSource, ticker:str, start=None) -> pd.Series:
+    '''
+    Coleta as cotações de um ticker, tentando novamente em caso de erro.
+
+    A espera entre tentativas dobra a cada falha, começando em
+    `app_config.DOWNLOAD_BACKOFF` segundos. Um resultado vazio na coleta do
+    histórico completo indica um ticker inexistente e não é repetido.
+
+    Parameters
+    ----------
+    source : PriceSource
+        Fonte das cotações.
+    ticker : str
+        Ticker desejado.
+    start : pandas.Timestamp, optional
+        Primeira data desejada.
+
+    Returns
+    -------
+    pandas.core.series.Series
+        Cotações de fechamento indexadas por data.
+
+    Raises
+    ------
+    LookupError
+        Se a fonte não possui cotações do ticker.
+
+    --------------------------------------------------------------------------
+    '''
+
+    for attempt in range(cfg.DOWNLOAD_RETRIES + 1):
+        try:
+            ds = source.fetch(ticker, start=start)
+            break
+        except Exception:
+            if attempt == cfg.DOWNLOAD_RETRIES:
+                raise
+            time.sleep(cfg.DOWNLOAD_BACKOFF * 2**attempt)
+
+    if start is None and ds.empty:
+        raise LookupError(f'Ticker "{ticker}" sem cotações')
+    return ds
+
+
+
+def update(
+        ticker: str,
+        store: PriceStore,
+        source: PriceSource
+    ) -> pd.Series:
+    '''
+    Atualiza o histórico armazenado de um ticker, buscando na fonte apenas as
+    cotações posteriores à última data armazenada.
+
+    Como as cotações são ajustadas por proventos, a última data armazenada é
+    buscada novamente. Se o seu valor mudou, todo o histórico é substituído.
+    O histórico também é coletado por completo quando foi armazenado com
+    menos anos que `app_config.PRICE_HISTORY`.
+
+    Parameters
+    ----------
+    ticker : str
+        Ticker desejado.
+    store : PriceStore
+        Armazenamento local das cotações.
+    source : PriceSource
+        Fonte das cotações.
+
+    Returns
+    -------
+    pandas.core.series.Series
+        Histórico atualizado do ticker.
+
+    --------------------------------------------------------------------------
+    '''
+
+    stored = store.load(ticker)
+    checked = store.checked(ticker)
+    covered = (store.coverage(ticker) or 0) >= cfg.PRICE_HISTORY
+    if not stored.empty and covered and checked is not None \
+            and time.time() - checked < cfg.PRICE_REFRESH:
+        return stored
+
+    try:
+        if stored.empty or not covered:
+            ds = fetch(source, ticker)
+            store.replace(ticker, ds)
+            store.cover(ticker, cfg.PRICE_HISTORY)
+        else:
+            last = stored.index[-1]
+            new = fetch(source, ticker, start=last)
+            if last in new.index \
+                    and not np.isclose(new[last], stored[last], rtol=1e-6):
+                ds = fetch(source, ticker)
+                store.replace(ticker, ds)
+                store.cover(ticker, cfg.PRICE_HISTORY)
+            else:
+                store.save(ticker, new)
+                ds = pd.concat([stored, new[new.index > last]])
+    except Exception:
+        if stored.empty:
+            raise
+        return stored
+
+    store.touch(ticker)
+    ds.name = ticker
+    return ds
+
+
+
+def get_history(
+        tickers: list,
+        store: PriceStore = None,
+        source: PriceSource = None
+    ) -> tuple:
+    '''
+    Cotações diárias de fechamento de cada ticker no período definido em
+    `app_config.PRICE_HISTORY`, usando o armazenamento local sempre que
+    possível.
+
+    Os tickers são atualizados em paralelo. Tickers que falharem ou que não
+    terminarem em `app_config.DOWNLOAD_DEADLINE` segundos são retornados
+    separadamente e ficam fora das cotações.
+
+    Parameters
+    ----------
+    tickers : list of str
+        Tickers desejados.
+    store : PriceStore, optional
+        Armazenamento local das cotações. Se for None, usa o padrão.
+    source : PriceSource, optional
+        Fonte das cotações. Se for None, usa o Yahoo! Finance.
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        Cotações diárias com uma coluna por ticker coletado.
+    list of str
+        Tickers que não puderam ser coletados.
+
+    --------------------------------------------------------------------------
+    '''
+
+    store = default_store() if store is None else store
+    source = default_source() if source is None else source
+
+    futures = {
+        ticker: download_pool().submit(update, ticker, store, source) \
+        for ticker in tickers
+    }
+    wait(futures.values(), timeout=cfg.DOWNLOAD_DEADLINE)
+
+    history = []
+    failed = []
+    for ticker, future in futures.items():
+        if future.done() and future.exception() is None:
+            history.append(future.result())
+        else:
+            future.cancel()
+            failed.append(ticker)
+
+    if history:
+        df = pd.concat(history, axis=1)
+    else:
+        df = pd.DataFrame(index=pd.DatetimeIndex([]))
+    start = pd.Timestamp.today().normalize() \
+        - pd.DateOffset(years=cfg.PRICE_HISTORY)
+    return df[df.index >= start].sort_index(), failed
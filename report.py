@@ -1,37 +1,341 @@
-from DadosAbertosBrasil import selic, bacen 
-
 import json
+import time
 
-import dash_bootstrap_components as dbc
 import dash_html_components as html
 
-import cvxopt as opt
-from cvxopt import blas, solvers
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import yfinance
+
+import app_config as cfg
+import cache
+import macro
+import optimizer
+import prices
+import serialize
+import stats
+import timeline
+
+
+
+# Colunas de métricas da tabela de portfólios
+METRICS = ['Retorno Esperado', 'Risco', 'Sharpe']
+
+
+
+# Quantidade de períodos de cada frequência em um mês. Retornos semanais e
+# diários são escalados para a base mensal, mantendo as métricas em % a.m. e
+# comparáveis à SELIC mensal
+PERIODS_PER_MONTH = {'M': 1, 'W': 52/12, 'D': 252/12}
+
+
+
+# Estimadores da matriz de covariância dos retornos. O estimador usado é
+# escolhido em `app_config.COVARIANCE`
+COVARIANCE = {
+    'sample': lambda moments: moments.cov(),
+    'ledoit_wolf': lambda moments: moments.shrinkage('identity')[0],
+    'constant_correlation': lambda moments: moments.shrinkage(
+        'constant_correlation'
+    )[0],
+    'factor': lambda moments: moments.factor_model(cfg.COVARIANCE_FACTORS)
+}
 
 
 
-solvers.options['show_progress'] = False
+# Grupos de tickers cujo peso total pode ser limitado em
+# `app_config.GROUP_CAPS`
+GROUPS = {
+    'crypto': lambda ticker: ticker.endswith(cfg.CRYPTO_SUFFIXES),
+    'foreign': lambda ticker: get_currency(ticker) != 'BRL'
+}
 
 
 
-def get_selic() -> float:
+# Etapas da geração do relatório, na ordem em que são executadas
+STAGES = {
+    'download': 'Coletando cotações',
+    'returns': 'Calculando retornos',
+    'correlation': 'Calculando correlações',
+    'optimization': 'Otimizando portfólios'
+}
+
+
+
+def notify(progress, stage:str):
     '''
-    Captura a atual taxa SELIC mensal para usá-la como taxa risk-free.
+    Informa o início de uma etapa da geração do relatório.
+
+    Parameters
+    ----------
+    progress : callable or None
+        Função que recebe o nome da etapa e a fração concluída do relatório.
+    stage : str
+        Nome da etapa, uma das chaves de `STAGES`.
+
+    --------------------------------------------------------------------------
+    '''
+
+    if progress is not None:
+        progress(stage, list(STAGES).index(stage) / len(STAGES))
+
+
+
+def parse_hashtags(hashtags:str) -> list:
+    '''
+    Normaliza as hashtags da URL em uma lista ordenada de tickers únicos.
+
+    Parameters
+    ----------
+    hashtags : str
+        Hashtags capturadas da URL.
 
     Returns
     -------
-    float
-        Taxa SELIC mensal.
+    list of str
+        Tickers em letras maiúsculas, sem repetições e em ordem alfabética.
+
+    --------------------------------------------------------------------------
+    '''
+
+    return sorted({t.strip().upper() for t in hashtags.split('#') if t.strip()})
+
+
+
+def allocations(
+        portfolios: pd.DataFrame,
+        threshold: float = optimizer.HOLDING
+    ) -> list:
+    '''
+    Alocação resumida de cada portfólio, com os tickers de peso relevante.
+
+    Parameters
+    ----------
+    portfolios : pandas.core.frame.DataFrame
+        Tabela de alocação de todos os portfólios.
+    threshold : float, default=optimizer.HOLDING
+        Peso mínimo para que o ticker apareça na alocação.
 
-    ----------------------------------------------------------------------
+    Returns
+    -------
+    list of dict
+        Para cada portfólio, os tickers ('labels') e pesos ('values').
+
+    --------------------------------------------------------------------------
+    '''
+
+    weights = portfolios.drop(columns=METRICS, errors='ignore')
+    tickers = weights.columns.to_numpy()
+    values = weights.to_numpy()
+    mask = values > threshold
+    return [
+        {
+            'labels': tickers[m].tolist(),
+            'values': v[m].tolist()
+        } for v, m in zip(values, mask)
+    ]
+
+
+
+def get_currency(ticker:str) -> str:
+    '''
+    Moeda de cotação de um ticker.
+
+    Parameters
+    ----------
+    ticker : str
+        Ticker desejado.
+
+    Returns
+    -------
+    str
+        'BRL' para tickers com os sufixos de `app_config.BRL_SUFFIXES` e
+        'USD' para os demais.
+
+    --------------------------------------------------------------------------
     '''
 
-    ao_ano = selic(ultimos=1).loc[0,'valor']
-    return (float(ao_ano)/100 + 1)**(1/12) - 1
+    return 'BRL' if ticker.endswith(cfg.BRL_SUFFIXES) else 'USD'
+
+
+
+def allocation_constraints(
+        tickers: list,
+        lower = None,
+        upper = None,
+        caps: dict = None,
+        max_assets: int = None
+    ) -> optimizer.Constraints:
+    '''
+    Restrições de alocação de um conjunto de tickers. Os parâmetros omitidos
+    usam os valores de `app_config`.
+
+    Parameters
+    ----------
+    tickers : list of str
+        Tickers, na ordem das colunas da otimização.
+    lower : float or dict, optional
+        Peso mínimo de todos os tickers ou de cada ticker. Tickers ausentes
+        do dict usam `app_config.WEIGHT_MIN`.
+    upper : float or dict, optional
+        Peso máximo de todos os tickers ou de cada ticker. Tickers ausentes
+        do dict usam `app_config.WEIGHT_MAX`.
+    caps : dict, optional
+        Peso máximo de cada grupo de `GROUPS`. Se for None, usa
+        `app_config.GROUP_CAPS`.
+    max_assets : int, optional
+        Quantidade máxima de tickers com peso em cada portfólio. Se for
+        None, usa `app_config.MAX_ASSETS`.
+
+    Returns
+    -------
+    optimizer.Constraints
+        Restrições de alocação por posição de cada ticker.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def _bounds(value, default):
+        if value is None:
+            return default
+        if isinstance(value, dict):
+            return [value.get(t, default) for t in tickers]
+        return value
+
+    if caps is None:
+        caps = cfg.GROUP_CAPS
+    unknown = [name for name in caps if name not in GROUPS]
+    if unknown:
+        raise ValueError(f'Grupos desconhecidos: {", ".join(unknown)}')
+
+    return optimizer.Constraints(
+        len(tickers),
+        lower = _bounds(lower, cfg.WEIGHT_MIN),
+        upper = _bounds(upper, cfg.WEIGHT_MAX),
+        groups = [[GROUPS[name](t) for t in tickers] for name in caps],
+        caps = list(caps.values()),
+        max_assets = cfg.MAX_ASSETS if max_assets is None else max_assets
+    )
+
+
+
+def period_returns(
+        df: pd.DataFrame,
+        dolar: pd.DataFrame,
+        freq: str = 'M',
+        how: str = 'any'
+    ) -> pd.DataFrame:
+    '''
+    Percentual de variação das cotações convertidas para BRL (real) em cada
+    período.
+
+    Parameters
+    ----------
+    df : pandas.core.frame.DataFrame
+        Cotações diárias de cada ticker na sua moeda original.
+    dolar : pandas.core.frame.DataFrame
+        Cotações do dólar na mesma frequência `freq`.
+    freq : str, default='M'
+        Frequência dos retornos: 'M' (mensal), 'W' (semanal) ou 'D' (diária,
+        em dias úteis).
+    how : str, default='any'
+        Descarta os períodos sem retorno de algum ticker ('any') ou apenas
+        os períodos sem retorno de nenhum ticker ('all'). Como os retornos
+        de cada ticker não dependem dos demais, os retornos de um conjunto
+        maior de tickers calculados com 'all' podem ser compartilhados entre
+        análises de subconjuntos (ver `batch`).
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        Retornos indexados pelo último dia de cada período.
+
+    --------------------------------------------------------------------------
+    '''
+
+    if freq == 'D':
+        closes = df.reindex(pd.bdate_range(df.index.min(), df.index.max()))
+    else:
+        closes = df.resample(freq).last()
+    usd = dolar['USD'].reindex(closes.index).to_numpy()
+    mask = np.array([get_currency(t) != 'BRL' for t in closes.columns])
+
+    values = closes.to_numpy(dtype=float, copy=True)
+    values[:, mask] *= usd[:, None]
+
+    returns = pd.DataFrame(
+        values,
+        index = closes.index,
+        columns = closes.columns
+    )
+    return returns.ffill().pct_change(fill_method=None).dropna(how=how)
+
+
+
+def load(
+        hashtags: str,
+        progress = None,
+        previous: str = None,
+        period: int = None,
+        freq: str = 'M'
+    ) -> tuple:
+    '''
+    Carrega o relatório das hashtags, reaproveitando o relatório em cache
+    quando o mesmo conjunto de tickers já foi analisado com os mesmos dados
+    e a mesma janela.
+
+    Parameters
+    ----------
+    hashtags : str
+        Hashtags capturadas da URL.
+    progress : callable, optional
+        Função que recebe o nome e a fração concluída de cada etapa.
+    previous : str, optional
+        ID do último relatório do usuário. Se ainda estiver em cache, seus
+        cálculos são reaproveitados para os tickers em comum.
+    period : int, optional
+        Janela da análise, em anos. Se for None, usa
+        `app_config.PRICE_PERIOD`.
+    freq : str, default='M'
+        Frequência dos retornos usados na otimização: 'M', 'W' ou 'D'.
+
+    Returns
+    -------
+    str
+        ID do relatório, derivado dos tickers, da data da última cotação e
+        da janela.
+    Markowitz
+        Relatório de análise de diversificação.
+
+    --------------------------------------------------------------------------
+    '''
+
+    tickers = parse_hashtags(hashtags)
+    notify(progress, 'download')
+    df, failed = prices.get_history(tickers)
+    if df.empty:
+        raise ValueError(f'Nenhum ticker coletado: {", ".join(failed)}')
+    period = period or cfg.PRICE_PERIOD
+    report_id = cache.report_key(tickers, df.index.max(), period, freq)
+
+    # Um relatório em cache com tickers que falharam só é reaproveitado se
+    # os mesmos tickers falharam novamente na coleta
+    r = cache.reports.get(report_id)
+    if r is None or getattr(r, 'missing', None) != failed:
+        if previous is not None and previous != report_id:
+            previous = cache.reports.get(previous)
+        else:
+            previous = None
+        r = Markowitz(
+            hashtags,
+            df = df,
+            progress = progress,
+            previous = previous,
+            period = period,
+            freq = freq
+        )
+        cache.reports.put(report_id, r)
+    return report_id, r
 
 
 
@@ -44,305 +348,468 @@ class Markowitz:
     ----------
     hashtags : str
         Hashtags capturadas da URL.
+    store : prices.PriceStore, optional
+        Armazenamento local das cotações. Se for None, usa o padrão.
+    source : prices.PriceSource, optional
+        Fonte das cotações. Se for None, usa o Yahoo! Finance.
+    df : pandas.core.frame.DataFrame, optional
+        Cotações diárias já coletadas. Se for None, as cotações são
+        coletadas a partir de `store` e `source`.
+    progress : callable, optional
+        Função que recebe o nome e a fração concluída de cada etapa.
+    previous : Markowitz, optional
+        Relatório anterior com os mesmos dados. A fronteira parte dos seus
+        portfólios e, se a janela for a mesma, os momentos dos tickers em
+        comum são reaproveitados.
+    period : int, optional
+        Janela da análise, em anos. Se for None, usa
+        `app_config.PRICE_PERIOD`.
+    freq : str, default='M'
+        Frequência dos retornos usados na otimização: 'M' (mensal), 'W'
+        (semanal) ou 'D' (diária). As métricas são sempre mensais.
+    constraints : dict, optional
+        Restrições de alocação, com os parâmetros de
+        `allocation_constraints` (por exemplo {'upper': 0.2,
+        'max_assets': 10}). Os parâmetros omitidos usam `app_config`.
+    returns : pandas.core.frame.DataFrame, optional
+        Retornos de um conjunto maior de tickers, calculados com
+        `period_returns(..., how='all')` sobre as mesmas cotações e janela.
+        Se for informado, os retornos dos tickers da análise são extraídos
+        dele em vez de recalculados.
+    daily : pandas.core.frame.DataFrame, optional
+        Retornos diários (`stats.daily_returns`) de um conjunto maior de
+        tickers, sobre as mesmas cotações e janela, compartilhados da mesma
+        forma que `returns`.
 
     Attributes
     ----------
     tickers : pandas.core.indexes.base.Index
         Tickers usados na análise.
+    failed : list of str
+        Tickers que não puderam ser coletados ou que não têm cotações na
+        janela e ficaram fora da análise.
+    missing : list of str
+        Tickers que não puderam ser coletados (ausentes de `history`).
+    history : pandas.core.frame.DataFrame
+        Cotações diárias de todo o histórico armazenado, das quais são
+        derivadas todas as janelas.
     df : pandas.core.frame.DataFrame
-        Cotações diárias nos últimos 5 anos de cada ticker na sua moeda
-        original.
+        Cotações diárias dos últimos `period` anos de cada ticker na sua
+        moeda original.
     returns : pandas.core.frame.DataFrame
-        Percentual de variação mensal das cotações convertidas para BRL (real)
-        de cada ticker.
+        Percentual de variação das cotações convertidas para BRL (real) de
+        cada ticker, na frequência `freq`.
     dolar : pandas.core.frame.DataFrame
-        Cotações do último dia de cada mês do câmbio do Dólar.
+        Cotações do câmbio do Dólar no último dia de cada período, ou None
+        caso os retornos tenham sido informados em `returns`.
+    moments : stats.Moments
+        Momentos dos retornos na frequência `freq`, usados na otimização.
+    daily : stats.Moments
+        Momentos dos retornos diários alinhados, usados na correlação.
+    corr : pandas.core.frame.DataFrame
+        Matriz de correlação dos retornos diários entre os tickers.
+    mus : numpy.ndarray
+        Coeficientes de aversão ao risco de cada portfólio, em ordem
+        crescente.
+    weights : pandas.core.frame.DataFrame
+        Pesos dos portfólios na ordem dos coeficientes de aversão ao risco.
+    allocations : list of dict
+        Alocação resumida de cada portfólio, usada no gráfico de alocação.
+    selic : float
+        Taxa SELIC mensal usada como taxa risk-free.
+    tangency : pandas.core.series.Series or None
+        Pesos, retorno esperado, risco e Sharpe Ratio do portfólio de maior
+        Sharpe Ratio, ou None caso nenhum ticker supere a taxa risk-free.
+    cml : dict or None
+        Capital Market Line, com a taxa risk-free ('risk_free') e a
+        inclinação da reta ('sharpe').
+    solve_time : dict
+        Tempo, em segundos, da otimização da fronteira ('frontier'), do
+        limite de tickers ('cardinality') e do portfólio de tangência
+        ('tangency').
 
     --------------------------------------------------------------------------
     '''
 
-    def __init__(self, hashtags:str):
-        tickers = hashtags.split('#')
+    def __init__(
+            self,
+            hashtags: str,
+            store: prices.PriceStore = None,
+            source: prices.PriceSource = None,
+            df: pd.DataFrame = None,
+            progress = None,
+            previous: 'Markowitz' = None,
+            period: int = None,
+            freq: str = 'M',
+            constraints: dict = None,
+            returns: pd.DataFrame = None,
+            daily: pd.DataFrame = None
+        ):
+        self.hashtags = hashtags
+        self.period = period or cfg.PRICE_PERIOD
+        self.freq = freq
+        self.constraints = constraints or {}
+        tickers = parse_hashtags(hashtags)
         
         # Coletar dados
-        self.get_dolar()
-        t = yfinance.Tickers(' '.join(tickers))
-        self.df = t.history(
-            period = '5y',
-            auto_adjust = True,
-            progress = False
-        ).Close
+        notify(progress, 'download')
+        if returns is None:
+            self.get_dolar()
+        else:
+            self.dolar = None
+        if df is None:
+            df, _ = prices.get_history(tickers, store=store, source=source)
+        if df.empty:
+            raise ValueError(f'Nenhum ticker coletado: {", ".join(tickers)}')
+        self.history = df
+        self.missing = [t for t in tickers if t not in df.columns]
+        start = df.index.max() - pd.DateOffset(years=self.period)
+        self.df = df[df.index > start].dropna(axis=1, how='all')
+        self.failed = [t for t in tickers if t not in self.df.columns]
         
-        # Calcular retorno mensal
-        self.returns = self.df.groupby(
-            self.df.index.strftime('%Y-%m')
-        ).last()
-        for col in self.returns:
-            if not col.endswith('.SA'):
-                temp = pd.concat(
-                    [self.returns[col], self.dolar],
-                    axis = 1,
-                    join = 'inner'
-                )
-                self.returns[col] = temp[col] * temp.USD
-        self.returns = self.returns.pct_change().dropna()
-
+        # Calcular retornos
+        # O relatório anterior só é reaproveitado se usa os mesmos dados, e
+        # os seus momentos apenas se também usa a mesma janela
+        if previous is not None \
+                and previous.df.index.max() != self.df.index.max():
+            previous = None
+        same_window = previous is not None \
+            and (previous.period, previous.freq) == (self.period, self.freq)
+
+        notify(progress, 'returns')
+        if returns is None:
+            self.returns = period_returns(self.df, self.dolar, self.freq)
+        else:
+            self.returns = returns[self.df.columns].dropna()
+        if same_window \
+                and previous.returns.index.equals(self.returns.index):
+            self.moments = previous.moments.update(self.returns)
+        else:
+            self.moments = stats.Moments(self.returns)
         self.tickers = self.df.columns
-        self.optimize()
+
+        notify(progress, 'correlation')
+        if daily is None:
+            daily = stats.daily_returns(self.df)
+        else:
+            daily = daily[self.df.columns]
+        if same_window:
+            self.daily = previous.daily.update(daily)
+        else:
+            self.daily = stats.Moments(
+                daily,
+                min_periods = cfg.CORR_MIN_OVERLAP
+            )
+        self.corr = self.daily.corr()
+
+        notify(progress, 'optimization')
+        initial = None
+        if previous is not None:
+            initial = (
+                previous.mus,
+                previous.weights.reindex(
+                    columns = self.tickers,
+                    fill_value = 0.0
+                ).to_numpy()
+            )
+        self.optimize(initial)
 
 
     def get_dolar(self):
         '''
-        Coleta a cotação do dólar do final de cada mês desde 2015 e salva no
-        atributo `self.dolar`.
+        Coleta a cotação do dólar do final de cada período na frequência
+        `self.freq` e salva no atributo `self.dolar`.
 
         ----------------------------------------------------------------------
         '''
-        df = bacen.cambio(inicio='2015-01-01', index=True)
-        self.dolar = df.groupby(df.index.strftime('%Y-%m')).last()
+        self.dolar = macro.get_dolar(self.freq)
 
 
-    def corr_table(self) -> dbc.Table:
+    def window(self, period:int=None, freq:str=None) -> 'Markowitz':
         '''
-        Gera uma matriz de correlação em formato HTML.
+        Deriva o relatório de outra janela a partir do histórico já
+        carregado, sem coletar novas cotações.
+
+        Parameters
+        ----------
+        period : int, optional
+            Janela da análise, em anos. Se for None, mantém a atual.
+        freq : str, optional
+            Frequência dos retornos. Se for None, mantém a atual.
 
         Returns
         -------
-        dash_bootstrap_components.Table
-            Tabela de correlação formatada.
+        Markowitz
+            Relatório da nova janela. A fronteira parte dos portfólios deste
+            relatório.
 
         ----------------------------------------------------------------------
         '''
-        
-        def _table_head(th):
-            if th == 'index':
-                th = ''
-            return html.Th(
-                th,
-                className = 'corr_table_head'    
-            )
 
-        def _table_data(td, i, j):
-            if isinstance(td, str):
-                return html.Td(
-                    html.B(td)
-                )
-            else:
-                if td == 1:
-                    style = {
-                        'background-color': 'black',
-                        'color': 'black'
-                    }
-                elif td > 0:
-                    style = {
-                        'background-color': f'hsl(20, 100%, {50*(2-td)}%)',
-                    }
-                elif td < 0:
-                    style = {
-                        'background-color': f'hsl(200, 100%, {50*(2+td)}%)',
-                    }
-                else:
-                    style = None
-                return html.Td(
-                    f'{td:.2f}',
-                    className = 'corr_table_data',
-                    style = style,
-                    id = {
-                        'ticker_a': df.iat[i,0],
-                        'ticker_b': df.columns[j]
-                    }
-                )
-
-        df = self.df.corr().reset_index()
-        return dbc.Table([
-            html.Thead(
-                html.Tr([
-                    _table_head(th) for th in df.columns
-                ])
-            ),
-            html.Tbody([
-                html.Tr([
-                    _table_data(td, i, j) for j, td in enumerate(row)
-                ]) for i, row in df.iterrows()
-            ])
-        ],
-            bordered = True,
-            style = {'font-size': 12}
+        return Markowitz(
+            self.hashtags,
+            df = self.history,
+            previous = self,
+            period = period or self.period,
+            freq = freq or self.freq,
+            constraints = self.constraints
         )
 
 
-    def optimize(self) -> pd.DataFrame:
+    def corr_matrix(self) -> go.Figure:
         '''
-        Gera um DataFrame de portfólios otimizados.
+        Gera a matriz de correlação como um heatmap.
+
+        As cores e os textos de todas as células são calculados de uma vez.
+        Os valores só são escritos nas células quando há no máximo
+        `app_config.CORR_LABELS_MAX` tickers; acima disso ficam apenas no
+        hover, mantendo o tamanho do gráfico proporcional ao número de
+        células.
 
         Returns
         -------
-        pandas.core.frame.DataFrame
-            DataFrame de portfólios.
+        plotly.graph_objects.Figure
+            Heatmap da matriz de correlação.
 
         ----------------------------------------------------------------------
         '''
-        
-        # Returns setup
-        returns = np.asmatrix(self.returns.T)
-        n = len(returns)
-
-        # Optimizer setup
-        S = opt.matrix(np.cov(returns))
-        pbar = opt.matrix(np.mean(returns, axis=1))
-        G = -opt.matrix(np.eye(n))
-        h = opt.matrix(0.0, (n ,1))
-        A = opt.matrix(1.0, (1, n))
-        b = opt.matrix(1.0)
 
-        # Solve
-        mus = [10**(t/20-1) for t in range(100)]
-        portfolios = [solvers.qp(mu*S, -pbar, G, h, A, b)['x'] for mu in mus]
-
-        # Concatenate porfolios
-        concat = np.concatenate([np.asarray(portfolio) for portfolio in portfolios])
-        df = pd.DataFrame(concat.reshape(-1,n))
-        df.columns = self.tickers
+        tickers = np.array(self.corr.columns, dtype=object)
+        values = self.corr.to_numpy(dtype=float, copy=True)
+        n = len(tickers)
 
-        # Results
-        df['Retorno Esperado'] = [blas.dot(pbar, x) for x in portfolios]
-        df['Risco'] = [np.sqrt(blas.dot(x, S*x)) for x in portfolios]
+        # A diagonal fica transparente, mostrando o fundo preto do gráfico
+        np.fill_diagonal(values, np.nan)
+        text = np.where(np.isnan(values), '', np.char.mod('%.2f', values))
+        hovertext = tickers[None,:] + '  x  ' + tickers[:,None] \
+            + '<br><b>' + text.astype(object) + '</b>'
 
-        df.index = df.index[::-1]
-        self.portfolios = df.sort_index()
-        risk_free = get_selic()
-        self.portfolios['Sharpe'] = self.portfolios.apply(
-            lambda row: (row['Retorno Esperado'] - risk_free) / row['Risco'],
-            axis = 1 
+        fig = go.Figure(
+            data = go.Heatmap(
+                z = values,
+                x = tickers,
+                y = tickers,
+                zmin = -1,
+                zmax = 1,
+                colorscale = [
+                    [0, 'hsl(200, 100%, 50%)'],
+                    [0.5, 'white'],
+                    [1, 'hsl(20, 100%, 50%)']
+                ],
+                showscale = False,
+                hovertext = hovertext,
+                hoverinfo = 'text',
+                xgap = 1,
+                ygap = 1
+            ),
+            layout = {
+                'margin': {'b': 10, 't': 10, 'l': 10, 'r': 10},
+                'height': min(max(40*n + 120, 300), 900),
+                'plot_bgcolor': 'black',
+                'xaxis': {'side': 'top', 'showgrid': False},
+                'yaxis': {'autorange': 'reversed', 'showgrid': False},
+            }
         )
 
+        if n <= cfg.CORR_LABELS_MAX:
+            i, j = np.nonzero(text != '')
+            fig.update_layout(annotations=[
+                {
+                    'x': x,
+                    'y': y,
+                    'text': t,
+                    'showarrow': False,
+                    'font': {'size': 12}
+                } for x, y, t in zip(tickers[j], tickers[i], text[i, j])
+            ])
 
+        return fig
 
-class CorrelationTimeline:
-    '''
-    Carrega toda a estrutura do modal de comparação dos históricos de dois
-    tickers diferentes.
 
-    Parameters
-    ----------
-    ticker_a : str
-        Primeiro ticker que será comparado.
-    ticker_b : str
-        Segundo ticker que será comparado.
-
-    --------------------------------------------------------------------------
-    '''
+    def optimize(self, initial:tuple=None) -> pd.DataFrame:
+        '''
+        Gera um DataFrame de portfólios otimizados.
 
-    def __init__(self, ticker_a:str, ticker_b:str):
-        self.ticker_a = ticker_a
-        self.ticker_b = ticker_b
+        A fronteira é amostrada de forma adaptativa
+        (`optimizer.adaptive_frontier`), de forma que a quantidade de
+        portfólios varia entre relatórios, até o limite de
+        `app_config.FRONTIER_POINTS`. Com `app_config.FRONTIER_ADAPTIVE`
+        desligado, é usada a grade fixa de `optimizer.risk_aversion`.
 
+        Os portfólios seguem as restrições de `allocation_constraints`, e o
+        tempo de cada etapa da otimização fica em `self.solve_time`.
 
-    def plot(self, data):
-        '''
-        Gera uma timeline de cotações de um ticker (quando o valor de ticker_a
-        for igual ao ticker_b) ou dois tickers (quando ticker_a e ticker_b
-        forem diferentes).
+        A matriz de covariância é estimada com o estimador de
+        `app_config.COVARIANCE` (ver `COVARIANCE`). Por padrão é usada a
+        covariância amostral. Os estimadores com shrinkage ou fatores são
+        indicados para muitos tickers com poucos períodos, quando a
+        covariância amostral é singular.
 
         Parameters
         ----------
-        data : dict
-            Histórico de cotações dos tickers.
+        initial : tuple, optional
+            Coeficientes de aversão ao risco e pesos de uma fronteira
+            calculada anteriormente, usados como ponto inicial.
 
         Returns
         -------
-        plotly.graph_objects.Figure
-            Gráfico de linhas com histórico de cotações de um ou dois tickers.
+        pandas.core.frame.DataFrame
+            DataFrame de portfólios.
 
         ----------------------------------------------------------------------
         '''
+        
+        # Returns setup, na base mensal
+        scale = PERIODS_PER_MONTH[self.freq]
+        # O modelo de fatores é passado ao otimizador na forma fatorada
+        cov = COVARIANCE[cfg.COVARIANCE](self.moments) * scale
+        S = cov.to_numpy()
+        if not isinstance(cov, stats.FactorCovariance):
+            cov = S
+        pbar = self.moments.mean().to_numpy() * scale
+        limits = allocation_constraints(list(self.tickers), **self.constraints)
 
-        if self.ticker_a == self.ticker_b:
-            fig = self.plot_single(data)
+        # Solve
+        start = time.perf_counter()
+        if cfg.FRONTIER_ADAPTIVE:
+            mus, weights = optimizer.adaptive_frontier(
+                cov,
+                pbar,
+                budget = cfg.FRONTIER_POINTS,
+                tolerance = cfg.FRONTIER_TOLERANCE,
+                initial = initial,
+                constraints = limits
+            )
         else:
-            fig = self.plot_multi(data)
+            mus = optimizer.risk_aversion(cfg.FRONTIER_POINTS)
+            if initial is not None and len(initial[0]) != len(mus):
+                initial = None
+            weights = optimizer.efficient_frontier(
+                cov,
+                pbar,
+                mus,
+                initial = None if initial is None else initial[1],
+                constraints = limits
+            )
+        self.solve_time = {'frontier': time.perf_counter() - start}
+
+        start = time.perf_counter()
+        if limits.max_assets is not None:
+            weights = optimizer.limit_holdings(
+                cov,
+                pbar,
+                mus,
+                weights,
+                limits,
+                time_budget = cfg.CARDINALITY_TIME
+            )
+        self.solve_time['cardinality'] = time.perf_counter() - start
+        self.mus = np.asarray(mus)
+        self.weights = pd.DataFrame(weights, columns=self.tickers)
+        df = self.weights.copy()
+
+        # Results
+        df['Retorno Esperado'] = weights @ pbar
+        df['Risco'] = np.sqrt(np.einsum('ij,jk,ik->i', weights, S, weights))
 
-        fig.update_layout(
-            margin = {'b': 10, 't': 10},
-            showlegend = False
+        df.index = df.index[::-1]
+        self.portfolios = df.sort_index()
+        self.selic = macro.get_selic()
+        self.portfolios['Sharpe'] = self.sharpe_ratio(self.selic)
+        self.allocations = allocations(self.portfolios)
+
+        # Portfólio de tangência e Capital Market Line
+        start = time.perf_counter()
+        tangency = optimizer.tangency_portfolio(
+            cov,
+            pbar,
+            self.selic,
+            limits
         )
+        self.solve_time['tangency'] = time.perf_counter() - start
+        if tangency is None:
+            self.tangency = None
+            self.cml = None
+        else:
+            risk = np.sqrt(tangency @ S @ tangency)
+            sharpe = (tangency @ pbar - self.selic) / risk
+            self.tangency = pd.Series(tangency, index=self.tickers)
+            self.tangency['Retorno Esperado'] = tangency @ pbar
+            self.tangency['Risco'] = risk
+            self.tangency['Sharpe'] = sharpe
+            self.cml = {'risk_free': self.selic, 'sharpe': float(sharpe)}
 
-        return fig
-    
 
-    def plot_single(self, data:dict) -> go.Figure:
+    def sharpe_ratio(self, risk_free:float) -> pd.Series:
         '''
-        Gera o gráfico de timeline de um ticker.
+        Calcula o Sharpe Ratio de cada portfólio otimizado.
 
         Parameters
         ----------
-        data : dict
-            Histórico de cotações dos tickers.
+        risk_free : float
+            Taxa de retorno livre de risco.
 
         Returns
         -------
-        plotly.graph_objects.Figure
-            Gráfico de linhas com histórico de cotações de um ticker.
+        pandas.core.series.Series
+            Sharpe Ratio de cada portfólio.
 
         ----------------------------------------------------------------------
         '''
 
-        ds = pd.read_json(data)[self.ticker_a]
-        ds = ds.dropna()
+        excess = self.portfolios['Retorno Esperado'] - risk_free
+        return excess / self.portfolios['Risco']
 
-        return go.Figure(
-            data = go.Scatter(
-                x = ds.index,
-                y = ds,
-                name = self.ticker_a,
-                hoverinfo = 'skip'
-            )
-        )
 
 
-    def plot_multi(self, data:dict) -> go.Figure:
+class CorrelationTimeline:
+    '''
+    Carrega toda a estrutura do modal de comparação dos históricos de dois
+    tickers diferentes.
+
+    Parameters
+    ----------
+    ticker_a : str
+        Primeiro ticker que será comparado.
+    ticker_b : str
+        Segundo ticker que será comparado.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, ticker_a:str, ticker_b:str):
+        self.ticker_a = ticker_a
+        self.ticker_b = ticker_b
+
+
+    def data(self, df:pd.DataFrame) -> dict:
         '''
-        Gera o gráfico com as timelines dos dois tickers.
+        Histórico dos tickers comparados, codificado com `serialize`.
+
+        Apenas as datas em que todos os tickers comparados possuem cotação
+        são incluídas. A correlação móvel (`timeline.ROLLING`), quando
+        presente em `df`, é codificada separadamente em 'rolling'.
 
         Parameters
         ----------
-        data : dict
-            Histórico de cotações dos tickers.
+        df : pandas.core.frame.DataFrame
+            Histórico de cotações que contém os tickers comparados, por
+            exemplo de `timeline.history`.
 
         Returns
         -------
-        plotly.graph_objects.Figure
-            Gráfico de linhas com histórico de cotações normalizado de dois
-            tickers.
+        dict
+            Histórico codificado por `serialize.encode_frame`.
 
         ----------------------------------------------------------------------
         '''
 
-        df = pd.read_json(data)[[self.ticker_a, self.ticker_b]]
-        df = df.dropna()
-
-        fig = go.Figure(
-            layout = {
-                'yaxis': {'visible': False},
-            }
-        )
-
-        for ticker in [self.ticker_a, self.ticker_b]:
-
-            # Normalizar histórico do ticker
-            ds = (df[ticker] - df[ticker].min()) \
-                / (df[ticker].max() - df[ticker].min()) 
-
-            fig.add_trace(
-                go.Scatter(
-                    x = df.index,
-                    y = ds,
-                    name = ticker,
-                    hoverinfo = 'skip'
-                )
-            )
-
-        return fig
+        columns = list(dict.fromkeys([self.ticker_a, self.ticker_b]))
+        df = df.dropna(subset=columns)
+        payload = serialize.encode_frame(df, columns)
+        if len(columns) > 1 and timeline.ROLLING in df:
+            payload['rolling'] = serialize.encode_array(df[timeline.ROLLING])
+        return payload
 
 
     def title(self) -> list:
@@ -383,26 +850,49 @@ class MarkowitzAllocation:
 
     Parameters
     ----------
-    data : dict
+    data : pandas.core.frame.DataFrame
         Tabela de alocação de todos os portfólios.
     portfolio : int
         ID do portfólio deste relatório.
+    allocation : dict, optional
+        Alocação resumida do portfólio, como em `allocations`. Se for None,
+        é calculada a partir da tabela.
 
     --------------------------------------------------------------------------
     '''
 
-    def __init__(self, data:dict, portfolio:int):
+    def __init__(
+            self,
+            data: pd.DataFrame,
+            portfolio: int,
+            allocation: dict = None
+        ):
         self.p = portfolio
-        self.portfolios = pd.read_json(data)
+        self.portfolios = data
         self.portfolio = self.portfolios.iloc[portfolio,:]
+        if allocation is None:
+            allocation = allocations(self.portfolios.iloc[[portfolio]])[0]
+        self.allocation = allocation
 
 
-    def efficiency_frontier(self):
+    def efficiency_frontier(self, tangency:pd.Series=None):
         '''
         Fronteira da Eficiência. Gráfico que apresenta o conjunto de
         portfólios que maximizam o lucro em função do risco (desvio padrão) do
         portfólio.
 
+        O gráfico é gerado uma única vez por relatório e o destaque do
+        portfólio selecionado é aplicado no browser
+        (`assets/clientside.js`).
+
+        Parameters
+        ----------
+        tangency : pandas.core.series.Series, optional
+            Portfólio de maior Sharpe Ratio, como em `Markowitz.tangency`.
+            Se for informado, o portfólio e a Capital Market Line são
+            adicionados ao gráfico. Caso contrário, o destaque de maior
+            Sharpe Ratio aponta para o melhor portfólio amostrado.
+
         Returns
         -------
         plotly.graph_objects.Figure
@@ -411,19 +901,18 @@ class MarkowitzAllocation:
         ----------------------------------------------------------------------
         '''
 
+        def hover(x, y, z):
+            return f'<b>Retorno Esperado:</b> {y:.1%}<br>' \
+                + f'<b>Risco:</b> ±{x:.1%}<br>' \
+                + f'<b>Sharpe Ratio:</b> {z:.2f}'
+
         text = [
-            f'<b>Retorno Esperado:</b> {y:.1%}<br>' \
-            + f'<b>Risco:</b> ±{x:.1%}<br>' \
-            + f'<b>Sharpe Ratio:</b> {z:.2f}'
-            for x, y, z in zip(
+            hover(x, y, z) for x, y, z in zip(
                 self.portfolios['Risco'],
                 self.portfolios['Retorno Esperado'],
                 self.portfolios['Sharpe']
             )
         ]
-        marker_color = ['yellow' if n==self.p else 'cyan' for n in range(101)]
-        marker_size = [12 if n==self.p else 8 for n in range(101)]
-
         fig = go.Figure(
             data = go.Scatter(
                 x = self.portfolios['Risco'],
@@ -431,8 +920,8 @@ class MarkowitzAllocation:
                 name = 'Fronteira da Eficiência',
                 mode = 'markers',
                 marker = {
-                    'size': marker_size,
-                    'color': marker_color,
+                    'size': 8,
+                    'color': 'cyan',
                     'opacity': 1,
                     'line': {
                         'color': 'blue',
@@ -455,10 +944,38 @@ class MarkowitzAllocation:
             }
         )
         
-        max_sharpe = self.portfolios['Sharpe'].idxmax()
+        if tangency is None:
+            best = self.portfolios.loc[self.portfolios['Sharpe'].idxmax()]
+        else:
+            best = tangency
+            risk_free = best['Retorno Esperado'] - best['Sharpe']*best['Risco']
+            risk = [0, self.portfolios['Risco'].max()]
+            fig.add_trace(go.Scatter(
+                x = risk,
+                y = [risk_free + best['Sharpe']*r for r in risk],
+                name = 'Capital Market Line',
+                mode = 'lines',
+                line = {'color': 'blue', 'width': 1, 'dash': 'dash'},
+                hoverinfo = 'skip'
+            ))
+            fig.add_trace(go.Scatter(
+                x = [best['Risco']],
+                y = [best['Retorno Esperado']],
+                name = 'Portfólio de Tangência',
+                mode = 'markers',
+                marker = {'size': 10, 'color': 'blue', 'symbol': 'star'},
+                hovertext = [hover(
+                    best['Risco'],
+                    best['Retorno Esperado'],
+                    best['Sharpe']
+                )],
+                hoverinfo = 'text'
+            ))
+            fig.update_layout(showlegend=False)
+
         fig.add_annotation(
-            x = self.portfolios.loc[max_sharpe, 'Risco'],
-            y = self.portfolios.loc[max_sharpe, 'Retorno Esperado'],
+            x = best['Risco'],
+            y = best['Retorno Esperado'],
             text = 'Maior Sharpe Ratio',
             showarrow = True,
             arrowhead = 1,
@@ -472,32 +989,6 @@ class MarkowitzAllocation:
         return fig
 
     
-    def pie(self) -> go.Pie:
-        '''
-        Gráfico de alocação de recursos.
-
-        Returns
-        -------
-        plotly.graph_objects.Pie
-            Pie chart de alocação de recursos.
-        
-        ----------------------------------------------------------------------
-        '''
-        ds = self.portfolio[:-3][self.portfolio > 0.0001]
-        return go.Figure(
-            data = go.Pie(
-                labels = ds.index,
-                values = ds,
-                hole = 0.4,
-                textinfo = 'label+percent',
-                hoverinfo = 'skip'
-            ),
-            layout = go.Layout(
-                margin = {'b': 0, 't': 0}
-            )
-        )
-
-
     def expected_returns(self):
         '''
         Retorno e risco esperado para o portfólio selecionado.
@@ -528,204 +1019,62 @@ class CapitalAllocation:
     '''
     Gera o relatório de alocação de renda risk-free.
 
+    A mesma lógica é executada no browser a partir de `payload`
+    (`assets/clientside.js`), de forma que a escolha da proporção de renda
+    fixa não depende do servidor.
+
     Parameters
     ----------
-    data : dict
-        Dados do portfólio selecionado.
+    data : dict or str
+        Dados do portfólio selecionado, como dicionário ou JSON.
+    selic : float, optional
+        Taxa SELIC mensal. Se for None, é capturada com `macro.get_selic`.
+    cml : dict, optional
+        Capital Market Line, como em `Markowitz.cml`. Se for informada, o
+        retorno da Capital Market Line com o mesmo risco de cada proporção
+        de renda fixa é exibido como referência.
 
     Attributes
     ----------
     selic : float
         Taxa SELIC mensal.
+    cml : dict or None
+        Capital Market Line.
 
     --------------------------------------------------------------------------
     '''
 
+    # Quantidade de intervalos da Capital Allocation Line
+    STEPS = 20
 
-    def __init__(self, data:dict):
-        self.data = json.loads(data)
-        self.selic = get_selic()
 
+    def __init__(self, data, selic:float=None, cml:dict=None):
+        self.data = json.loads(data) if isinstance(data, str) else dict(data)
+        self.selic = macro.get_selic() if selic is None else selic
+        self.cml = cml
 
-    def capital_allocation_line(self, selected_portfolio:int) -> go.Figure:
-        '''
-        Gera um gráfico de alocação de capital risk-free.
-
-        Returns
-        -------
-        plotly.graph_objects.Figure
-            Capital Allocation Line
 
-        ----------------------------------------------------------------------
+    def payload(self) -> dict:
         '''
-
-        razao = [i/20 for i in range(21)]
-        retorno = [
-            self.weigh_risk_free(
-                value = self.data['Retorno Esperado'],
-                risk_free_rate = self.selic,
-                p = p
-            ) for p in razao
-        ]
-        risco = [
-            self.weigh_risk_free(
-                value = self.data['Risco'],
-                risk_free_rate = 0,
-                p = p
-            ) for p in razao
-        ]
-        text = [
-            f'<b>Proporção de Renda Fixa:</b> {ra:.0%}<br>' \
-            + f'<b>Retorno Esperado:</b> {100*re:.1f} ± {ri:.1%} a.m.' \
-            for ra, re, ri in zip(razao, retorno, risco)
-        ]
-
-        marker_color = ['yellow' if n==selected_portfolio else 'cyan' \
-            for n in range(21)]
-        marker_size = [12 if n==selected_portfolio else 8 for n in range(21)]
-
-        return go.Figure(
-            data = go.Scatter(
-                x = razao,
-                y = retorno,
-                mode = 'lines+markers',
-                hovertext = text,
-                hoverinfo = 'text',
-                marker = {
-                    'size': marker_size,
-                    'color': marker_color,
-                    'opacity': 1,
-                    'line': {
-                        'color': 'blue',
-                        'width': 2
-                    }
-                },
-                line = {
-                    'color': 'blue',
-                    'width': 3
-                }
-            ),
-            layout = {
-                'margin': {'b': 10, 't': 10},
-                'xaxis': {
-                    'tickformat': ',.0%',
-                    'autorange': 'reversed',
-                    'title': {'text': 'Proporção de Renda Fixa'}
-                },
-                'yaxis': {
-                    'tickformat': ',.1%',
-                    'title': {'text': r'Retorno Esperado (% a.m.)'}
-                },
-            }
-        )
-
-
-    def final_table(self, p:float) -> list:
-        '''
-        Tabela final do relatório que informa as porcentagem de alocação da
-        carteira considerando a alocação em renda fixa.
-
-        Parameters
-        ----------
-        p : float
-            Proporção da taxa risk-free que será adicionada à variável.
+        Dados mínimos para gerar a Capital Allocation Line no browser.
 
         Returns
         -------
-        list of dash_html_components
-            Lista de table rows para a tabela final de alocação.
+        dict
+            Pesos dos tickers relevantes, retorno esperado, risco, taxa SELIC
+            mensal, Capital Market Line e quantidade de intervalos da linha.
 
         ----------------------------------------------------------------------
         '''
 
-        def tr(ticker):
-            value = self.weigh_risk_free(
-                value = self.data[ticker],
-                risk_free_rate = 0,
-                p = p
-            )
-            return html.Tr([
-                html.Td(ticker),
-                html.Td(f'{value:.1%}')
-            ])
-
-        renda_fixa = [
-            html.Td('Renda Fixa'),
-            html.Td(f'{p:.1%}')    
-        ]
-
-        renda_variavel = [tr(ticker) for ticker in self.data \
-            if ticker not in ['Retorno Esperado', 'Risco', 'Sharpe']]
-
-        return renda_fixa + renda_variavel
-
-
-    def weigh_risk_free(
-            self,
-            value: float,
-            risk_free_rate: float,
-            p: float
-        ) -> float:
-        '''
-        Adiciona o peso da taxa risk-free a uma variável.
-
-        Parameters
-        ----------
-        value : float
-            Valor da variável que será ponderada.
-        risk_free_rate : float
-            Valor da taxa risk-free.
-        p : float
-            Proporção da taxa risk-free que será adicionada à variável.
-
-        Returns
-        -------
-        float
-            Valor ponderada para a variável.
-
-        ----------------------------------------------------------------------
-        '''
-
-        return p*risk_free_rate + (1-p)*value
-
-
-    def expected_returns(self, p:float) -> list:
-        '''
-        Retorno e risco esperado para o portfólio selecionado.
-
-        Parameters
-        ----------
-        p : float
-            Proporção da taxa risk-free que será adicionada à variável.
-
-        Returns
-        -------
-        list of dash_html_components
-            Risco e retorno esperado em formato HTML.
-
-        ----------------------------------------------------------------------
-        '''
-
-        retorno = self.weigh_risk_free(
-            value = self.data['Retorno Esperado'],
-            risk_free_rate = self.selic,
-            p = p
-        )
-
-        risco = self.weigh_risk_free(
-            value = self.data['Risco'],
-            risk_free_rate = 0,
-            p = p
-        )
-
-        return [
-            html.B(
-                f'{retorno:.1%} a.m.',
-                style = {'font-size': 24}    
-            ),
-            html.Span(
-                f'(±{risco:.1%})',
-                style = {'font-size': 16},
-                className = 'ml-2'
-            )
-        ]
+        weights = {
+            k: v for k, v in self.data.items() if k not in METRICS
+        }
+        return {
+            'weights': weights,
+            'expected_return': self.data['Retorno Esperado'],
+            'risk': self.data['Risco'],
+            'selic': self.selic,
+            'cml': self.cml,
+            'steps': self.STEPS
+        }
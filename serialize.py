@@ -0,0 +1,151 @@
+import base64
+
+import numpy as np
+import pandas as pd
+
+
+
+def encode_array(values, dtype:str='float32') -> dict:
+    '''
+    Codifica um array numérico como bytes little-endian em base64.
+
+    Parameters
+    ----------
+    values : array-like
+        Valores que serão codificados.
+    dtype : str, default='float32'
+        Tipo numérico dos valores codificados.
+
+    Returns
+    -------
+    dict
+        Tipo ('dtype') e bytes em base64 ('data') do array.
+
+    --------------------------------------------------------------------------
+    '''
+
+    dtype = np.dtype(dtype).newbyteorder('<')
+    values = np.ascontiguousarray(values, dtype=dtype)
+    return {
+        'dtype': dtype.name,
+        'data': base64.b64encode(values.tobytes()).decode('ascii')
+    }
+
+
+
+def decode_array(payload:dict) -> np.ndarray:
+    '''
+    Decodifica um array gerado por `encode_array`.
+
+    Parameters
+    ----------
+    payload : dict
+        Array codificado.
+
+    Returns
+    -------
+    numpy.ndarray
+        Valores do array.
+
+    --------------------------------------------------------------------------
+    '''
+
+    dtype = np.dtype(payload['dtype']).newbyteorder('<')
+    return np.frombuffer(base64.b64decode(payload['data']), dtype=dtype)
+
+
+
+def encode_frame(
+        df: pd.DataFrame,
+        columns: list = None,
+        dtype: str = 'float32'
+    ) -> dict:
+    '''
+    Codifica um DataFrame indexado por datas em formato colunar.
+
+    As datas são codificadas como dias desde 1970-01-01 (int32) e cada
+    coluna como um array separado, de forma que as colunas possam ser
+    decodificadas individualmente, tanto no servidor quanto no browser
+    (`assets/clientside.js`).
+
+    Parameters
+    ----------
+    df : pandas.core.frame.DataFrame
+        DataFrame com índice de datas e valores numéricos.
+    columns : list of str, optional
+        Colunas codificadas. Se for None, todas as colunas são codificadas.
+    dtype : str, default='float32'
+        Tipo numérico das colunas codificadas.
+
+    Returns
+    -------
+    dict
+        Datas ('index'), nomes das colunas ('columns') e colunas
+        codificadas ('data').
+
+    --------------------------------------------------------------------------
+    '''
+
+    if columns is None:
+        columns = list(df.columns)
+    days = df.index.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    return {
+        'index': encode_array(days, 'int32'),
+        'columns': list(columns),
+        'data': {col: encode_array(df[col], dtype) for col in columns}
+    }
+
+
+
+def decode_columns(payload:dict, columns:list=None) -> tuple:
+    '''
+    Decodifica apenas as colunas desejadas de um DataFrame gerado por
+    `encode_frame`, sem montar o DataFrame.
+
+    Parameters
+    ----------
+    payload : dict
+        DataFrame codificado.
+    columns : list of str, optional
+        Colunas decodificadas. Se for None, todas as colunas são
+        decodificadas.
+
+    Returns
+    -------
+    numpy.ndarray
+        Datas, como datetime64.
+    dict
+        Valores de cada coluna.
+
+    --------------------------------------------------------------------------
+    '''
+
+    if columns is None:
+        columns = payload['columns']
+    index = decode_array(payload['index']).astype('datetime64[D]')
+    return index, {col: decode_array(payload['data'][col]) for col in columns}
+
+
+
+def decode_frame(payload:dict, columns:list=None) -> pd.DataFrame:
+    '''
+    Decodifica um DataFrame gerado por `encode_frame`.
+
+    Parameters
+    ----------
+    payload : dict
+        DataFrame codificado.
+    columns : list of str, optional
+        Colunas decodificadas. Se for None, todas as colunas são
+        decodificadas.
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        DataFrame decodificado.
+
+    --------------------------------------------------------------------------
+    '''
+
+    index, data = decode_columns(payload, columns)
+    return pd.DataFrame(data, index=pd.DatetimeIndex(index))
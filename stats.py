@@ -0,0 +1,489 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+
+def daily_returns(df:pd.DataFrame) -> pd.DataFrame:
+    '''
+    Retornos diários alinhados entre tickers de calendários diferentes.
+
+    As cotações são reindexadas em um calendário fixo de dias úteis, o que
+    descarta as cotações de fim de semana (criptomoedas). Cada retorno só é
+    calculado quando o ticker tem cotação no dia e no dia útil anterior, de
+    forma que todos os retornos cubram o mesmo intervalo e os retornos de
+    um ticker não dependam dos demais tickers.
+
+    Parameters
+    ----------
+    df : pandas.core.frame.DataFrame
+        Cotações diárias de cada ticker.
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        Retornos diários, com NaN onde o retorno não pode ser calculado.
+
+    --------------------------------------------------------------------------
+    '''
+
+    index = pd.bdate_range(df.index.min(), df.index.max())
+    return df.reindex(index).pct_change(fill_method=None).iloc[1:]
+
+
+
+def rolling_moments(
+        x: np.ndarray,
+        y: np.ndarray,
+        window: int,
+        min_periods: int = None
+    ) -> tuple:
+    '''
+    Covariância e correlação móveis entre duas séries de retornos.
+
+    Os momentos de cada janela são obtidos pela diferença de somas
+    acumuladas, de forma que cada nova data apenas adiciona a observação
+    que entra e remove a que sai da janela, em O(n) no total. Datas em que
+    alguma das séries não tem retorno são ignoradas.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        Retornos alinhados das duas séries, com NaN onde não há retorno.
+    window : int
+        Quantidade de datas de cada janela.
+    min_periods : int, optional
+        Quantidade mínima de datas com retorno nas duas séries para calcular
+        a janela. Se for None, usa `window`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Covariância de cada janela, terminada em cada data.
+    numpy.ndarray
+        Correlação de Pearson de cada janela, terminada em cada data.
+
+    --------------------------------------------------------------------------
+    '''
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    m = (~np.isnan(x) & ~np.isnan(y)).astype(float)
+    x = np.where(m > 0, x, 0.0)
+    y = np.where(m > 0, y, 0.0)
+
+    # Somas de cada janela a partir das somas acumuladas
+    sums = np.cumsum(np.vstack([m, x, y, x*x, y*y, x*y]), axis=1)
+    sums = np.hstack([np.zeros((6, 1)), sums])
+    start = np.maximum(np.arange(1, len(x) + 1) - window, 0)
+    n, sx, sy, sxx, syy, sxy = sums[:, 1:] - sums[:, start]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cxy = sxy - sx * sy / n
+        cov = cxy / (n - 1)
+        corr = cxy / np.sqrt((sxx - sx**2 / n) * (syy - sy**2 / n))
+    corr = np.clip(corr, -1, 1)
+
+    invalid = n < max(window if min_periods is None else min_periods, 2)
+    cov[invalid] = np.nan
+    corr[invalid] = np.nan
+    return cov, corr
+
+
+
+class Moments:
+    '''
+    Momentos pareados (contagem, soma, soma dos quadrados e produtos
+    cruzados) de uma matriz de retornos com dados faltantes.
+
+    Todos os momentos são calculados com produtos de matrizes, e a
+    correlação e a covariância de cada par de tickers usam apenas as datas
+    em que ambos possuem retorno. Tickers podem ser adicionados ou
+    removidos sem recalcular os pares existentes.
+
+    Parameters
+    ----------
+    returns : pandas.core.frame.DataFrame
+        Retornos com uma coluna por ticker.
+    min_periods : int, default=1
+        Quantidade mínima de datas em comum para calcular um par.
+
+    Attributes
+    ----------
+    overlap : pandas.core.frame.DataFrame
+        Quantidade de datas em comum de cada par de tickers.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, returns:pd.DataFrame, min_periods:int=1):
+        self.min_periods = min_periods
+        self.index = returns.index
+        self.columns = list(returns.columns)
+
+        values = returns.to_numpy(dtype=float)
+        self._M = (~np.isnan(values)).astype(float)
+        self._X = np.where(self._M > 0, values, 0.0)
+
+        self._n = self._M.T @ self._M
+        self._sx = self._X.T @ self._M
+        self._sxx = (self._X**2).T @ self._M
+        self._sxy = self._X.T @ self._X
+
+
+    @property
+    def overlap(self) -> pd.DataFrame:
+        return self._frame(self._n.astype(int))
+
+
+    def _frame(self, values):
+        return pd.DataFrame(values, index=self.columns, columns=self.columns)
+
+
+    def mean(self) -> pd.Series:
+        '''
+        Retorno médio de cada ticker.
+
+        Returns
+        -------
+        pandas.core.series.Series
+            Média de todos os retornos disponíveis de cada ticker.
+
+        ----------------------------------------------------------------------
+        '''
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.diag(self._sx) / np.diag(self._n)
+        return pd.Series(mean, index=self.columns)
+
+
+    def cov(self, ddof:int=1) -> pd.DataFrame:
+        '''
+        Matriz de covariância pareada.
+
+        Parameters
+        ----------
+        ddof : int, default=1
+            Graus de liberdade descontados do número de observações.
+
+        Returns
+        -------
+        pandas.core.frame.DataFrame
+            Covariância de cada par de tickers.
+
+        ----------------------------------------------------------------------
+        '''
+
+        n = self._n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = (self._sxy - self._sx * self._sx.T / n) / (n - ddof)
+        cov[n < max(self.min_periods, ddof + 1)] = np.nan
+        return self._frame(cov)
+
+
+    def corr(self) -> pd.DataFrame:
+        '''
+        Matriz de correlação de Pearson pareada.
+
+        Returns
+        -------
+        pandas.core.frame.DataFrame
+            Correlação de cada par de tickers.
+
+        ----------------------------------------------------------------------
+        '''
+
+        n = self._n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cxy = self._sxy - self._sx * self._sx.T / n
+            vx = self._sxx - self._sx**2 / n
+            corr = cxy / np.sqrt(vx * vx.T)
+        corr = np.clip(corr, -1, 1)
+        corr[n < max(self.min_periods, 2)] = np.nan
+        return self._frame(corr)
+
+
+    def add(self, returns:pd.Series):
+        '''
+        Adiciona um ticker, calculando apenas os momentos dos novos pares.
+
+        Parameters
+        ----------
+        returns : pandas.core.series.Series
+            Retornos do novo ticker. O nome da série é usado como ticker.
+
+        ----------------------------------------------------------------------
+        '''
+
+        # Datas novas entram como linhas vazias para os tickers existentes,
+        # o que não altera os momentos já calculados
+        index = self.index.union(returns.index)
+        if len(index) > len(self.index):
+            rows = self.index.get_indexer(index)
+            missing = rows < 0
+            X = np.zeros((len(index), len(self.columns)))
+            M = np.zeros((len(index), len(self.columns)))
+            X[~missing] = self._X[rows[~missing]]
+            M[~missing] = self._M[rows[~missing]]
+            self._X, self._M, self.index = X, M, index
+
+        values = returns.reindex(self.index).to_numpy(dtype=float)
+        m = (~np.isnan(values)).astype(float)
+        x = np.where(m > 0, values, 0.0)
+
+        n = self._M.T @ m
+        sx = self._X.T @ m
+        sy = self._M.T @ x
+        sxx = (self._X**2).T @ m
+        syy = self._M.T @ x**2
+        sxy = self._X.T @ x
+
+        def _grow(matrix, col, row, corner):
+            return np.block([
+                [matrix, col[:, None]],
+                [row[None, :], np.array([[corner]])]
+            ])
+
+        mm, xm, xx = m @ m, x @ m, x @ x
+        self._n = _grow(self._n, n, n, mm)
+        self._sx = _grow(self._sx, sx, sy, xm)
+        self._sxx = _grow(self._sxx, sxx, syy, (x**2) @ m)
+        self._sxy = _grow(self._sxy, sxy, sxy, xx)
+
+        self._X = np.column_stack([self._X, x])
+        self._M = np.column_stack([self._M, m])
+        self.columns.append(returns.name)
+
+
+    def remove(self, ticker:str):
+        '''
+        Remove um ticker e todos os seus pares.
+
+        Parameters
+        ----------
+        ticker : str
+            Ticker que será removido.
+
+        ----------------------------------------------------------------------
+        '''
+
+        i = self.columns.index(ticker)
+        keep = [j for j in range(len(self.columns)) if j != i]
+        for attr in ['_n', '_sx', '_sxx', '_sxy']:
+            setattr(self, attr, getattr(self, attr)[np.ix_(keep, keep)])
+        self._X = self._X[:, keep]
+        self._M = self._M[:, keep]
+        self.columns.pop(i)
+
+
+    def update(self, returns:pd.DataFrame) -> 'Moments':
+        '''
+        Gera os momentos de um novo conjunto de tickers reaproveitando os
+        pares já calculados. Os tickers ausentes de `returns` são removidos
+        e os novos são adicionados.
+
+        Parameters
+        ----------
+        returns : pandas.core.frame.DataFrame
+            Retornos do novo conjunto de tickers. As colunas já existentes
+            devem ter os mesmos retornos usados nos momentos atuais.
+
+        Returns
+        -------
+        Moments
+            Novos momentos, na ordem das colunas de `returns`.
+
+        ----------------------------------------------------------------------
+        '''
+
+        new = copy.deepcopy(self)
+        for ticker in [t for t in self.columns if t not in returns.columns]:
+            new.remove(ticker)
+        for ticker in [t for t in returns.columns if t not in self.columns]:
+            new.add(returns[ticker])
+
+        order = [new.columns.index(t) for t in returns.columns]
+        for attr in ['_n', '_sx', '_sxx', '_sxy']:
+            setattr(new, attr, getattr(new, attr)[np.ix_(order, order)])
+        new._X = new._X[:, order]
+        new._M = new._M[:, order]
+        new.columns = list(returns.columns)
+        return new
+
+
+    def _centered(self) -> np.ndarray:
+        '''
+        Retornos subtraídos da média de cada ticker, com zero nas datas sem
+        retorno.
+        '''
+        mean = np.nan_to_num(self.mean().to_numpy())
+        return np.where(self._M > 0, self._X - mean, 0.0)
+
+
+    def shrinkage(self, target:str='identity') -> tuple:
+        '''
+        Matriz de covariância encolhida em direção a uma matriz estruturada,
+        com a intensidade ótima de Ledoit e Wolf.
+
+        A covariância amostral de poucos períodos para muitos tickers é
+        singular e instável. A combinação δF + (1 - δ)S com a matriz alvo F
+        é sempre positiva definida, e a intensidade δ é estimada a partir da
+        variância de cada termo da covariância amostral. Todos os termos são
+        calculados com produtos de matrizes, usando apenas as datas em comum
+        de cada par de tickers.
+
+        Parameters
+        ----------
+        target : str, default='identity'
+            Matriz alvo:
+            - 'identity': identidade escalada pela variância média (Ledoit
+              e Wolf, 2004);
+            - 'constant_correlation': variâncias amostrais e correlação
+              média entre todos os pares (Ledoit e Wolf, 2003).
+
+        Returns
+        -------
+        pandas.core.frame.DataFrame
+            Matriz de covariância encolhida.
+        float
+            Intensidade δ do encolhimento, entre 0 e 1.
+
+        ----------------------------------------------------------------------
+        '''
+
+        S = self.cov().to_numpy()
+        var = np.diag(S)
+        n = self._n
+        T = np.diag(n).mean()
+
+        if target == 'identity':
+            F = np.diag(np.full(len(var), np.nanmean(var)))
+        elif target == 'constant_correlation':
+            sd = np.sqrt(var)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                r = S / np.outer(sd, sd)
+            np.fill_diagonal(r, np.nan)
+            rbar = np.nanmean(r) if np.isfinite(r).any() else 0.0
+            F = rbar * np.outer(sd, sd)
+            np.fill_diagonal(F, var)
+        else:
+            raise ValueError(f'Matriz alvo desconhecida: {target}')
+
+        # Pares sem datas suficientes em comum assumem o valor do alvo
+        S = np.where(np.isnan(S), F, S)
+        Y = self._centered()
+        Y2 = Y**2
+        C = Y.T @ Y
+
+        # Variância média de cada termo y_i*y_j em torno de s_ij
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pi = (Y2.T @ Y2 - 2*S*C + S**2 * n) / n
+        pi = np.nan_to_num(pi)
+
+        if target == 'identity':
+            rho = 0.0
+        else:
+            # Covariância média entre os termos y_i² e y_i*y_j
+            with np.errstate(invalid='ignore', divide='ignore'):
+                theta = (
+                    (Y2 * Y).T @ Y - S * (Y2.T @ self._M)
+                    - var[:, None] * C + var[:, None] * S * n
+                ) / n
+                ratio = np.sqrt(var[None, :] / var[:, None])
+            terms = np.nan_to_num(ratio * theta + ratio.T * theta.T)
+            np.fill_diagonal(terms, 0.0)
+            rho = np.trace(pi) + rbar / 2 * terms.sum()
+
+        gamma = ((F - S)**2).sum()
+        delta = 1.0 if gamma == 0 else float(np.clip(
+            (pi.sum() - rho) / gamma / T, 0, 1
+        ))
+        return self._frame(delta * F + (1 - delta) * S), delta
+
+
+    def factor_model(self, factors:int) -> 'FactorCovariance':
+        '''
+        Aproxima a matriz de covariância por um modelo de fatores
+        estatísticos: Σ = BB' + D.
+
+        Os fatores são os principais componentes da covariância amostral, e
+        a variância de cada ticker não explicada pelos fatores fica na
+        diagonal D, que é mantida positiva.
+
+        Parameters
+        ----------
+        factors : int
+            Quantidade de fatores. É limitada a um a menos que a quantidade
+            de tickers.
+
+        Returns
+        -------
+        FactorCovariance
+            Covariância do modelo de fatores.
+
+        ----------------------------------------------------------------------
+        '''
+
+        S = np.nan_to_num(self.cov().to_numpy())
+        k = max(min(factors, len(S) - 1), 1)
+        values, vectors = np.linalg.eigh(S)
+        values = np.clip(values[::-1][:k], 0, None)
+        loadings = vectors[:, ::-1][:, :k] * np.sqrt(values)
+
+        var = np.diag(S)
+        floor = 1e-4 * max(var.mean(), np.finfo(float).tiny)
+        specific = np.maximum(var - (loadings**2).sum(axis=1), floor)
+        return FactorCovariance(loadings, specific, self.columns)
+
+
+
+class FactorCovariance:
+    '''
+    Matriz de covariância de um modelo de fatores: Σ = BB' + D, com B de
+    posto baixo (n x k) e D diagonal.
+
+    Apenas B e a diagonal de D são armazenados, de forma que o otimizador
+    possa resolver o problema na forma fatorada
+    (`optimizer.efficient_frontier`), cujo custo cresce com a quantidade de
+    fatores e não com n².
+
+    Parameters
+    ----------
+    loadings : numpy.ndarray
+        Exposição de cada ticker a cada fator (n x k).
+    specific : numpy.ndarray
+        Variância específica de cada ticker (n).
+    columns : list of str, optional
+        Tickers de cada linha.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(
+            self,
+            loadings: np.ndarray,
+            specific: np.ndarray,
+            columns: list = None
+        ):
+        self.loadings = np.ascontiguousarray(loadings, dtype=float)
+        self.specific = np.ascontiguousarray(specific, dtype=float)
+        self.columns = columns
+
+
+    def __mul__(self, scale:float) -> 'FactorCovariance':
+        return FactorCovariance(
+            self.loadings * np.sqrt(scale),
+            self.specific * scale,
+            self.columns
+        )
+
+
+    __rmul__ = __mul__
+
+
+    def to_numpy(self) -> np.ndarray:
+        '''
+        Matriz de covariância completa (n x n).
+        '''
+        return self.loadings @ self.loadings.T + np.diag(self.specific)
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+
+import app_config as cfg
+
+
+
+class Database:
+    '''
+    Banco SQLite com uma conexão por thread.
+
+    Expõe a mesma interface de `sqlite3.Connection` usada no projeto
+    (`execute`, `executemany` e o gerenciador de contexto de transações),
+    permitindo que o mesmo objeto seja compartilhado entre as threads do
+    worker. Conexões herdadas de outro processo (por exemplo, abertas no
+    processo mestre do gunicorn antes do fork) são descartadas e abertas
+    novamente.
+
+    Parameters
+    ----------
+    path : str
+        Caminho do arquivo do banco.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def __init__(self, path:str):
+        self.path = path
+        self._local = threading.local()
+
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+
+    def executemany(self, *args):
+        return self.conn.executemany(*args)
+
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+
+    def __exit__(self, *args):
+        return self.conn.__exit__(*args)
+
+
+
+def connect(name:str) -> Database:
+    '''
+    Abre um banco SQLite dentro da pasta de cache.
+
+    O banco é aberto em modo WAL, de forma que vários workers do gunicorn
+    possam ler e escrever no mesmo arquivo ao mesmo tempo.
+
+    Parameters
+    ----------
+    name : str
+        Nome do arquivo do banco, sem extensão.
+
+    Returns
+    -------
+    Database
+        Banco com uma conexão por thread.
+
+    --------------------------------------------------------------------------
+    '''
+
+    os.makedirs(cfg.CACHE_DIR, exist_ok=True)
+    return Database(os.path.join(cfg.CACHE_DIR, f'{name}.sqlite3'))
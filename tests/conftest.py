@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_config as cfg
+
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    '''
+    Isola os bancos SQLite de cada teste em uma pasta temporária.
+    '''
+    monkeypatch.setattr(cfg, 'CACHE_DIR', str(tmp_path))
+    return tmp_path
@@ -0,0 +1,166 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app_config as cfg
+import prices
+
+
+
+class RecordingSource(prices.FrameSource):
+    '''
+    Fonte local que registra as coletas e pode falhar nas primeiras
+    `failures` chamadas.
+    '''
+
+    def __init__(self, df, failures=0, delay=0.0):
+        super().__init__(df)
+        self.calls = []
+        self.failures = failures
+        self.delay = delay
+
+
+    def fetch(self, ticker, start=None):
+        self.calls.append((ticker, start))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('fonte indisponível')
+        return super().fetch(ticker, start)
+
+
+
+def frame(days=30, tickers=('AAA.SA', 'BBB')):
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    values = 10 + np.arange(days * len(tickers)).reshape(days, -1) / 10
+    return pd.DataFrame(values, index=index, columns=list(tickers))
+
+
+@pytest.fixture
+def store():
+    return prices.SQLitePriceStore('test')
+
+
+@pytest.fixture
+def no_wait(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(prices.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+
+def test_first_update_fetches_full_history(store):
+    df = frame()
+    source = RecordingSource(df)
+    ds = prices.update('AAA.SA', store, source)
+
+    assert source.calls == [('AAA.SA', None)]
+    pd.testing.assert_series_equal(ds, df['AAA.SA'], check_freq=False)
+    assert store.coverage('AAA.SA') == cfg.PRICE_HISTORY
+
+
+def test_fresh_history_is_not_fetched(store):
+    source = RecordingSource(frame())
+    prices.update('AAA.SA', store, source)
+    prices.update('AAA.SA', store, source)
+    assert len(source.calls) == 1
+
+
+def test_incremental_update_fetches_only_new_days(store, monkeypatch):
+    df = frame()
+    prices.update('AAA.SA', store, RecordingSource(df.iloc[:-5]))
+
+    monkeypatch.setattr(cfg, 'PRICE_REFRESH', 0)
+    source = RecordingSource(df)
+    ds = prices.update('AAA.SA', store, source)
+
+    assert source.calls == [('AAA.SA', df.index[-6])]
+    pd.testing.assert_series_equal(ds, df['AAA.SA'], check_freq=False)
+    pd.testing.assert_series_equal(
+        store.load('AAA.SA'),
+        df['AAA.SA'],
+        check_freq = False
+    )
+
+
+def test_adjusted_prices_trigger_full_refresh(store, monkeypatch):
+    df = frame()
+    prices.update('AAA.SA', store, RecordingSource(df.iloc[:-5]))
+
+    # Um provento ajusta todo o histórico, inclusive a última data armazenada
+    monkeypatch.setattr(cfg, 'PRICE_REFRESH', 0)
+    adjusted = df * 0.9
+    source = RecordingSource(adjusted)
+    ds = prices.update('AAA.SA', store, source)
+
+    assert source.calls == [('AAA.SA', df.index[-6]), ('AAA.SA', None)]
+    pd.testing.assert_series_equal(ds, adjusted['AAA.SA'], check_freq=False)
+    pd.testing.assert_series_equal(
+        store.load('AAA.SA'),
+        adjusted['AAA.SA'],
+        check_freq = False
+    )
+
+
+def test_stored_history_is_used_when_source_fails(store, monkeypatch, no_wait):
+    df = frame()
+    prices.update('AAA.SA', store, RecordingSource(df))
+
+    monkeypatch.setattr(cfg, 'PRICE_REFRESH', 0)
+    failing = RecordingSource(df, failures=cfg.DOWNLOAD_RETRIES + 1)
+    ds = prices.update('AAA.SA', store, failing)
+
+    pd.testing.assert_series_equal(ds, df['AAA.SA'], check_freq=False)
+    assert len(failing.calls) == cfg.DOWNLOAD_RETRIES + 1
+
+
+def test_failure_without_stored_history_raises(store, no_wait):
+    source = RecordingSource(frame(), failures=cfg.DOWNLOAD_RETRIES + 1)
+    with pytest.raises(ConnectionError):
+        prices.update('AAA.SA', store, source)
+
+
+
+def test_fetch_retries_with_exponential_backoff(no_wait):
+    source = RecordingSource(frame(), failures=cfg.DOWNLOAD_RETRIES)
+    ds = prices.fetch(source, 'AAA.SA')
+
+    assert not ds.empty
+    assert len(source.calls) == cfg.DOWNLOAD_RETRIES + 1
+    assert no_wait == [
+        cfg.DOWNLOAD_BACKOFF * 2**i for i in range(cfg.DOWNLOAD_RETRIES)
+    ]
+
+
+def test_fetch_unknown_ticker_is_not_retried(no_wait):
+    source = RecordingSource(frame())
+    with pytest.raises(LookupError):
+        prices.fetch(source, 'XXX')
+    assert len(source.calls) == 1
+    assert no_wait == []
+
+
+
+def test_get_history_reports_partial_failures(store):
+    df = frame()
+    result, failed = prices.get_history(
+        ['AAA.SA', 'BBB', 'XXX'],
+        store,
+        RecordingSource(df)
+    )
+
+    assert failed == ['XXX']
+    assert list(result.columns) == ['AAA.SA', 'BBB']
+    pd.testing.assert_frame_equal(result, df, check_freq=False)
+
+
+def test_get_history_gives_up_after_deadline(store, monkeypatch):
+    monkeypatch.setattr(cfg, 'DOWNLOAD_DEADLINE', 0.1)
+    source = RecordingSource(frame(), delay=1.0)
+    result, failed = prices.get_history(['AAA.SA'], store, source)
+
+    assert failed == ['AAA.SA']
+    assert result.empty
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app_config as cfg
+import prices
+import timeline
+
+
+
+@pytest.fixture
+def store():
+    index = pd.bdate_range(end=pd.Timestamp('2025-06-30'), periods=252*8)
+    rng = np.random.default_rng(0)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (len(index), 2)), 0))
+    store = prices.SQLitePriceStore('test')
+    for i, ticker in enumerate(['A', 'B']):
+        store.replace(ticker, pd.Series(values[:, i], index=index))
+        store.touch(ticker)
+    return store
+
+
+
+def test_window_ends_at_last_quote(store):
+    df = timeline.history(['A', 'B'], store=store, years=5, points=10**6)
+
+    assert df.index.max() == pd.Timestamp('2025-06-30')
+    assert df.index.min() > pd.Timestamp('2020-06-30')
+    assert df.index.min() < pd.Timestamp('2020-07-08')
+
+
+def test_zoom_returns_full_resolution_range(store):
+    df = timeline.history(
+        ['A', 'B'],
+        start = '2025-01-01',
+        end = '2025-03-01',
+        store = store,
+        years = 5
+    )
+    days = pd.bdate_range('2025-01-01', '2025-02-28')
+
+    assert df.index.min() == days[0]
+    assert df.index.max() == days[-1]
+    assert len(df) == len(days) < cfg.TIMELINE_POINTS
+    assert timeline.ROLLING in df.columns
+    assert df[timeline.ROLLING].notna().all()
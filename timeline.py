@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+import app_config as cfg
+import cache
+import prices
+import stats
+
+
+
+# Coluna com a correlação móvel dos retornos diários de dois tickers
+ROLLING = 'Correlação móvel'
+
+
+
+_series = cache.ReportCache(cfg.TIMELINE_CACHE_SIZE)
+
+
+
+def lttb(x:np.ndarray, y:np.ndarray, points:int) -> np.ndarray:
+    '''
+    Largest-Triangle-Three-Buckets: seleciona os pontos de uma série que
+    melhor preservam o formato do gráfico.
+
+    Os pontos internos são divididos em `points - 2` blocos e, de cada
+    bloco, é escolhido o ponto que forma o maior triângulo com o ponto
+    escolhido no bloco anterior e a média do bloco seguinte. O primeiro e o
+    último pontos são sempre mantidos.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Valores do eixo X, em ordem crescente.
+    y : numpy.ndarray
+        Valores do eixo Y.
+    points : int
+        Quantidade de pontos selecionados.
+
+    Returns
+    -------
+    numpy.ndarray
+        Posições dos pontos selecionados, em ordem crescente.
+
+    --------------------------------------------------------------------------
+    '''
+
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+
+    selected = np.empty(points, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i+1]
+        nxt = slice(hi, edges[i+2]) if i + 2 < len(edges) else slice(n-1, n)
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (cy - y[a])
+        )
+        a = lo + int(area.argmax())
+        selected[i+1] = a
+
+    return selected
+
+
+
+def downsample(
+        df: pd.DataFrame,
+        points: int,
+        columns: list = None
+    ) -> pd.DataFrame:
+    '''
+    Reduz um histórico a aproximadamente `points` datas por coluna.
+
+    Cada coluna é reduzida com `lttb` e as datas selecionadas em qualquer
+    coluna são mantidas para todas, de forma que todas as colunas
+    continuem alinhadas e com valores reais.
+
+    Parameters
+    ----------
+    df : pandas.core.frame.DataFrame
+        Histórico sem dados faltantes nas colunas de `columns`.
+    points : int
+        Quantidade de pontos por coluna.
+    columns : list of str, optional
+        Colunas usadas na seleção das datas. Se for None, usa todas.
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        Histórico reduzido.
+
+    --------------------------------------------------------------------------
+    '''
+
+    if len(df) <= points:
+        return df
+
+    x = df.index.to_numpy(dtype='datetime64[D]').astype(float)
+    rows = np.unique(np.concatenate([
+        lttb(x, df[col].to_numpy(dtype=float), points)
+        for col in (df.columns if columns is None else columns)
+    ]))
+    return df.iloc[rows]
+
+
+
+def series(
+        ticker: str,
+        store: prices.PriceStore = None,
+        years: int = None
+    ) -> pd.Series:
+    '''
+    Histórico de um ticker na janela de análise, terminando na sua última
+    cotação, com cache em memória.
+
+    A série é lida do armazenamento de cotações e fica em cache até a
+    próxima consulta do ticker à fonte de dados.
+
+    Parameters
+    ----------
+    ticker : str
+        Ticker desejado.
+    store : prices.PriceStore, optional
+        Armazenamento de cotações. Se for None, usa o armazenamento padrão.
+    years : int, optional
+        Janela, em anos. Se for None, usa `app_config.PRICE_PERIOD`.
+
+    Returns
+    -------
+    pandas.core.series.Series
+        Cotações diárias do ticker.
+
+    --------------------------------------------------------------------------
+    '''
+
+    if store is None:
+        store = prices.default_store()
+
+    years = years or cfg.PRICE_PERIOD
+    key = f'{ticker}/{years}@{store.checked(ticker)}'
+    ds = _series.get(key)
+    if ds is None:
+        # A janela termina na última cotação, como em `report.Markowitz`
+        ds = store.load(ticker)
+        start = ds.index.max() - pd.DateOffset(years=years)
+        ds = ds[ds.index > start]
+        _series.put(key, ds)
+    return ds
+
+
+
+def history(
+        tickers: list,
+        start = None,
+        end = None,
+        points: int = None,
+        store: prices.PriceStore = None,
+        years: int = None,
+        window: int = None
+    ) -> pd.DataFrame:
+    '''
+    Histórico alinhado de um grupo de tickers, limitado a um intervalo de
+    datas e reduzido à resolução do gráfico.
+
+    Para dois tickers, inclui a coluna `ROLLING` com a correlação móvel dos
+    retornos diários (`stats.rolling_moments`), calculada sobre toda a
+    janela antes do corte do intervalo, de forma que as primeiras datas do
+    intervalo também tenham correlação.
+
+    Parameters
+    ----------
+    tickers : list of str
+        Tickers desejados.
+    start : str or datetime, optional
+        Data inicial. Se for None, começa na primeira cotação.
+    end : str or datetime, optional
+        Data final. Se for None, termina na última cotação.
+    points : int, optional
+        Quantidade de pontos por ticker. Se for None, usa
+        `app_config.TIMELINE_POINTS`.
+    store : prices.PriceStore, optional
+        Armazenamento de cotações. Se for None, usa o armazenamento padrão.
+    years : int, optional
+        Janela, em anos. Se for None, usa `app_config.PRICE_PERIOD`.
+    window : int, optional
+        Quantidade de dias úteis da correlação móvel. Se for None, usa
+        `app_config.ROLLING_WINDOW`.
+
+    Returns
+    -------
+    pandas.core.frame.DataFrame
+        Cotações das datas em que todos os tickers possuem cotação.
+
+    --------------------------------------------------------------------------
+    '''
+
+    if points is None:
+        points = cfg.TIMELINE_POINTS
+
+    if window is None:
+        window = cfg.ROLLING_WINDOW
+
+    tickers = list(dict.fromkeys(tickers))
+    df = pd.concat(
+        [series(t, store, years) for t in tickers],
+        axis = 1
+    )
+    # A janela do grupo termina na última cotação de qualquer ticker
+    window_start = df.index.max() \
+        - pd.DateOffset(years=years or cfg.PRICE_PERIOD)
+    df = df[df.index > window_start].dropna()
+    if len(tickers) == 2:
+        returns = stats.daily_returns(df).reindex(df.index)
+        _, corr = stats.rolling_moments(
+            returns[tickers[0]].to_numpy(),
+            returns[tickers[1]].to_numpy(),
+            window,
+            min_periods = window // 2
+        )
+        df[ROLLING] = corr
+
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start).normalize()]
+    if end is not None:
+        df = df[df.index <= pd.Timestamp(end)]
+    return downsample(df, points, tickers)
@@ -1,7 +1,7 @@
 import dash_bootstrap_components as dbc
 import dash_html_components as html
 
-import yfinance
+import metadata
 
 
 
@@ -38,12 +38,15 @@ def get_ticker_name(ticker:str) -> str:
     '''
 
     try:
-        t = yfinance.Ticker(ticker)
-        name = t.info['longName'] if 'longName' in t.info else t.info['shortName']
+        name = metadata.default_service().lookup(ticker)
+    except Exception:
+        name = None
+
+    if name is not None:
         color = 'primary'
         status = 'Ticker inserido'
 
-    except:
+    else:
         name = f'Ticker "{ticker}" não encontrado'
         color = 'danger'
         status = 'Erro! Tente novamente'
@@ -0,0 +1,152 @@
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+
+
+
+logger = logging.getLogger(__name__)
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos carregados sob demanda pelo app
+ENGINE = ['report', 'timeline', 'yfinance', 'DadosAbertosBrasil']
+
+
+
+def import_engine():
+    '''
+    Importa os módulos de relatório e das fontes de dados, que o app só
+    carrega no primeiro relatório.
+
+    --------------------------------------------------------------------------
+    '''
+
+    for name in ENGINE:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logger.warning('Falha ao importar o módulo: %s', name)
+
+
+
+# Etapas do aquecimento que acessam a rede
+NETWORK = ('selic', 'dolar')
+
+
+
+def prime_caches(steps:tuple=None):
+    '''
+    Preenche os caches compartilhados antes do primeiro acesso.
+
+    A taxa SELIC e o câmbio do dólar são atualizados no cache em SQLite e o
+    índice de tickers é carregado em memória. Falhas são apenas registradas
+    no log, já que os caches também são preenchidos no primeiro relatório.
+
+    Nenhum pool de threads é criado aqui: a função pode rodar no processo
+    mestre do gunicorn antes do fork, e threads não sobrevivem ao fork.
+
+    Parameters
+    ----------
+    steps : tuple of str, optional
+        Etapas executadas ('selic', 'dolar' e 'tickers'). Se for None,
+        executa todas.
+
+    --------------------------------------------------------------------------
+    '''
+
+    import macro
+    import metadata
+
+    funcs = {
+        'selic': macro.get_selic,
+        'dolar': macro.get_dolar,
+        'tickers': metadata.default_service
+    }
+    for name, func in funcs.items():
+        if steps is not None and name not in steps:
+            continue
+        try:
+            func()
+        except Exception:
+            logger.warning(
+                'Falha no aquecimento do cache: %s',
+                name,
+                exc_info = True
+            )
+
+
+
+def prime_caches_within(timeout:float) -> bool:
+    '''
+    Executa `prime_caches` esperando no máximo `timeout` segundos pelas
+    etapas que acessam a rede.
+
+    As etapas de `NETWORK` rodam em um subprocesso, que é encerrado se o
+    prazo terminar, de forma que uma fonte lenta ou fora do ar não bloqueie
+    o início do servidor e nenhuma thread fique ativa no fork dos workers.
+    Os valores coletados ficam no cache em SQLite, compartilhado com o
+    processo atual. As demais etapas rodam no próprio processo.
+
+    Parameters
+    ----------
+    timeout : float
+        Tempo máximo de espera, em segundos.
+
+    Returns
+    -------
+    bool
+        True se as etapas que acessam a rede terminaram dentro do prazo.
+
+    --------------------------------------------------------------------------
+    '''
+
+    code = (
+        f'import sys; sys.path.insert(0, {_HERE!r}); '
+        f'import warmup; warmup.prime_caches({NETWORK!r})'
+    )
+    finished = False
+    try:
+        subprocess.run([sys.executable, '-c', code], timeout=timeout)
+        finished = True
+    except subprocess.TimeoutExpired:
+        logger.warning(
+            'Aquecimento do cache interrompido após %s segundos',
+            timeout
+        )
+    except OSError:
+        logger.warning('Falha ao iniciar o aquecimento do cache', exc_info=True)
+
+    prime_caches(('tickers',))
+    return finished
+
+
+
+def start(caches:bool=True) -> threading.Thread:
+    '''
+    Importa os módulos de relatório e, opcionalmente, preenche os caches em
+    uma thread em segundo plano, sem atrasar o início do servidor.
+
+    Parameters
+    ----------
+    caches : bool, default=True
+        Se True, também executa `prime_caches`.
+
+    Returns
+    -------
+    threading.Thread
+        Thread do aquecimento.
+
+    --------------------------------------------------------------------------
+    '''
+
+    def _run():
+        import_engine()
+        if caches:
+            prime_caches()
+
+    thread = threading.Thread(target=_run, name='warmup', daemon=True)
+    thread.start()
+    return thread